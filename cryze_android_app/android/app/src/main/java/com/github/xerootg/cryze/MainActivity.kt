@@ -105,14 +105,12 @@ class MainActivity : ComponentActivity() {
         }
 
         // start getting frames hooked up
-        CryzeHttpClient.getCameras().forEach {
+        CryzeHttpClient.getInventory().forEach { deviceInfo ->
             Thread {
 
                 // IOTVideoSDK uses context for:
                 // - file storage path for p2p CB files (it never works??)
                 // - CONNECTIVITY_CHANGE broadcast receiver
-                val deviceInfo = CryzeHttpClient.getCameraInfo(it)
-
                 val camera = RestreamingVideoPlayer(deviceInfo, context)
                 camera.start()
                 runOnUiThread {
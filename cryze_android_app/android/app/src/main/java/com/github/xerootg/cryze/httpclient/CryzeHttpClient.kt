@@ -5,13 +5,14 @@ import android.os.HandlerThread
 import com.github.xerootg.cryze.BuildConfig.CRYZE_BACKEND_URL
 import com.github.xerootg.cryze.httpclient.responses.AccessCredential
 import com.github.xerootg.cryze.httpclient.responses.CameraInfo
+import com.github.xerootg.cryze.httpclient.responses.Inventory
 import com.tencentcs.iotvideo.messagemgr.ModelMessage
 import com.tencentcs.iotvideo.utils.LogUtils
 import okhttp3.MediaType.Companion.toMediaType
 import okhttp3.OkHttpClient
 import okhttp3.Request
 import okhttp3.RequestBody.Companion.toRequestBody
-import org.json.JSONArray
+import org.json.JSONObject
 
 // wrapper for async http requests
 private data class ClientResponse<T>(
@@ -30,6 +31,9 @@ private data class ClientResponse<T>(
     }
 }
 
+// The API failed fast because Wyze/Mars is down; it asked us to come back in retryAfterSeconds
+class UpstreamUnavailableException(message: String, val retryAfterSeconds: Long) : Exception(message)
+
 object CryzeHttpClient {
 
     private val mTaskThread: HandlerThread = HandlerThread("HttpSender")
@@ -49,9 +53,16 @@ object CryzeHttpClient {
         try {
             val request = Request.Builder()
                 .url("$SERVER/Camera/CameraToken?deviceId=$cameraId")
+                // OkHttp's default read timeout; the API stops working on it after that
+                .header("X-Request-Timeout", "10")
                 .build()
             val response = instance.newCall(request).execute()
             val code = response.code
+            if (code == 503) {
+                val retryAfter = response.header("Retry-After")?.toLongOrNull() ?: DEFAULT_RETRY_AFTER_SECONDS
+                response.close()
+                throw UpstreamUnavailableException("Camera credential unavailable, retry in ${retryAfter}s", retryAfter)
+            }
             if (code != 200) {
                 throw Exception("Failed to get camera credential: $code")
             }
@@ -69,6 +80,22 @@ object CryzeHttpClient {
     }
 
     fun getAccessCredentialByCameraId(cameraId: String): AccessCredential {
+        var attempt = 1
+        while (true) {
+            try {
+                return requestAccessCredential(cameraId)
+            } catch (e: UpstreamUnavailableException) {
+                if (attempt >= MAX_TOKEN_ATTEMPTS) {
+                    throw e
+                }
+                LogUtils.w(CryzeHttpClient::class.simpleName, "getAccessCredentialByCameraId: ${e.message} (attempt $attempt)")
+                Thread.sleep(minOf(e.retryAfterSeconds, MAX_RETRY_AFTER_SECONDS) * 1000)
+                attempt++
+            }
+        }
+    }
+
+    private fun requestAccessCredential(cameraId: String): AccessCredential {
         var tokenResult: ClientResponse<AccessCredential>? = null
         if (!mTaskTHandler.post {
                 tokenResult = getCameraCredential(cameraId)
@@ -82,40 +109,43 @@ object CryzeHttpClient {
         return tokenResult!!.getValue()
     }
 
-    private fun getCamerasInternal(): ClientResponse<List<String>> {
+    // Last /Camera/Inventory result and its ETag, so a repeat call is a 304; only touched on mTaskThread
+    private var inventory: List<CameraInfo> = emptyList()
+    private var inventoryETag: String? = null
+
+    // every camera in one request, instead of the camera list plus a DeviceInfo call per camera
+    private fun getInventoryInternal(): ClientResponse<List<CameraInfo>> {
         try {
-            val request = Request.Builder()
-                .url("$SERVER/Camera/CameraList")
-                .build()
-            val response = instance.newCall(request).execute()
+            val builder = Request.Builder()
+                .url("$SERVER/Camera/Inventory")
+            inventoryETag?.let { builder.header("If-None-Match", it) }
+            val response = instance.newCall(builder.build()).execute()
             val code = response.code
-
+            if (code == 304) {
+                response.close()
+                return ClientResponse(response = inventory, success = true, exception = null)
+            }
             // it'll get wrapped in an exception anyway
             if (code != 200) {
-                throw Exception("Failed to get cameras: $code")
+                throw Exception("Failed to get inventory: $code")
             }
-            val body = response.body?.string() ?: throw Exception("Failed to get cameras")
-            LogUtils.d(CryzeHttpClient::class.simpleName, "getCameras: Body: $body")
-
-            // Response is literally a list of camera ids (string!)
+            val body = response.body?.string() ?: throw Exception("Failed to get inventory")
+            LogUtils.d(CryzeHttpClient::class.simpleName, "getInventory: Body: $body")
 
-            val cameraIds = JSONArray(body)
-            val cameraList = mutableListOf<String>()
-            for (i in 0 until cameraIds.length()) {
-                cameraList.add(cameraIds.getString(i))
-            }
-            return ClientResponse(response = cameraList, success = true, exception = null)
+            inventory = Inventory.parseFrom(body).cameras
+            inventoryETag = response.header("ETag")
+            return ClientResponse(response = inventory, success = true, exception = null)
         } catch (e: Exception) {
             return ClientResponse(exception = e, success = false, response = null)
         }
     }
 
-    fun getCameras(): List<String> {
-        var response: ClientResponse<List<String>>? = null
+    fun getInventory(): List<CameraInfo> {
+        var response: ClientResponse<List<CameraInfo>>? = null
         if (!mTaskTHandler.post {
-                response = getCamerasInternal()
+                response = getInventoryInternal()
             }) {
-            throw Exception("Failed to get cameras, failed to post")
+            throw Exception("Failed to get inventory, failed to post")
         }
         while (response == null) {
             Thread.sleep(100)
@@ -124,58 +154,52 @@ object CryzeHttpClient {
         return response!!.getValue()
     }
 
+    // Model messages waiting for the next batch post; only touched on mTaskThread
+    private val pendingMessages = mutableListOf<JSONObject>()
+
+    // a connecting camera dumps dozens of properties at once, so they're
+    // collected for a moment and sent as one NDJSON request
     fun postCameraModelMessage(cameraId: String, message: ModelMessage) {
-        val data = message.data
-        val messageType = message.type.name
-        val path = message.path
-        val request = Request.Builder()
-            .url("$SERVER/CameraMessage?cameraId=$cameraId&messageType=$messageType&path=$path")
-            .post(data.toRequestBody("application/json".toMediaType()))
-            .build()
+        val item = JSONObject()
+            .put("cameraId", cameraId)
+            .put("messageType", message.type.name)
+            .put("path", message.path)
+            .put("data", message.data)
 
         if (!mTaskTHandler.post {
-                // frankly, I don't care about the response. It'll probably
-                // eventually be important, but not now.
-                instance.newCall(request).execute()
+                if (pendingMessages.isEmpty()) {
+                    mTaskTHandler.postDelayed({ flushCameraMessages() }, MESSAGE_BATCH_DELAY_MS)
+                }
+                pendingMessages.add(item)
             }) {
             throw Exception("Failed to put message, failed to post")
         }
     }
 
-    private fun getCameraInfoInternal(cameraId: String): ClientResponse<CameraInfo> {
+    private fun flushCameraMessages() {
+        if (pendingMessages.isEmpty()) {
+            return
+        }
+        val body = pendingMessages.joinToString("\n") { it.toString() }
+        pendingMessages.clear()
+        val request = Request.Builder()
+            .url("$SERVER/CameraMessage/Batch")
+            .post(body.toRequestBody("application/x-ndjson".toMediaType()))
+            .build()
+        // frankly, I don't care about the response. It'll probably
+        // eventually be important, but not now.
         try {
-            val request = Request.Builder()
-                .url("$SERVER/Camera/DeviceInfo?deviceId=$cameraId")
-                .build()
-            val response = instance.newCall(request).execute()
-            val code = response.code
-            // it'll get wrapped in an exception anyway
-            if (code != 200) {
-                throw Exception("Failed to get camera info: $code")
-            }
-            val body = response.body?.string() ?: throw Exception("Failed to get camera info")
-            LogUtils.d(CryzeHttpClient::class.simpleName, "getCameraInfo: Body: $body")
-            return ClientResponse(response = CameraInfo.parseFrom(body), success = true, exception = null)
+            instance.newCall(request).execute().close()
         } catch (e: Exception) {
-            return ClientResponse(exception = e, success = false, response = null)
+            LogUtils.w(CryzeHttpClient::class.simpleName, "Failed to post camera messages: ${e.message}")
         }
     }
 
-    fun getCameraInfo(it: String): CameraInfo {
-        var response: ClientResponse<CameraInfo>? = null
-        if (!mTaskTHandler.post {
-                response = getCameraInfoInternal(it)
-            }) {
-            throw Exception("Failed to get camera info, failed to post")
-        }
-        while (response == null) {
-            Thread.sleep(100)
-        }
-
-        return response!!.getValue()
-    }
-
     private const val SERVER = CRYZE_BACKEND_URL
+    private const val MESSAGE_BATCH_DELAY_MS = 50L
+    private const val MAX_TOKEN_ATTEMPTS = 3
+    private const val DEFAULT_RETRY_AFTER_SECONDS = 5L
+    private const val MAX_RETRY_AFTER_SECONDS = 60L
     private val instance: OkHttpClient by lazy {
         OkHttpClient.Builder()
             .build()
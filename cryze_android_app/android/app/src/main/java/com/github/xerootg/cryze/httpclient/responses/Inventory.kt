@@ -0,0 +1,14 @@
+package com.github.xerootg.cryze.httpclient.responses
+
+import com.google.gson.Gson
+
+data class Inventory(
+    val version: Int,
+    val cameras: List<CameraInfo>
+){
+    companion object {
+        fun parseFrom(responseBody: String): Inventory {
+            return Gson().fromJson(responseBody, Inventory::class.java)
+        }
+    }
+}
@@ -0,0 +1,388 @@
+"""Load test / benchmark for the API, run in-process against local stand-ins.
+
+The app is served by uvicorn on a loopback port inside this process. Wyze's
+REST API is replaced by an in-memory client that returns N synthetic cameras
+(after an optional delay), and Mars regist_gw_user by a local HTTP server with
+configurable latency, so the httpx token path is exercised over real sockets.
+
+    python benchmark.py --cameras 50 --mars-latency 0.2 --output bench.json
+    python benchmark.py --baseline bench.json        # compare; exit 1 on regression
+
+Scenarios run in order: message bursts (one POST per message, then the same
+traffic as per-camera batches), token storm, dashboard polling, and all three
+mixed. Each reports throughput and p50/p90/p99 latency per endpoint.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+MESSAGE_TYPES = ("MSG_TYPE_PRO_CONST", "MSG_TYPE_PRO_READONLY", "MSG_TYPE_PRO_WRITABLE", "MSG_TYPE_EVENT", "MSG_TYPE_ACTION")
+READONLY_PATHS = ("_otaVersion", "_netInfo", "_batteryLevel", "_wifiSignal")
+WRITABLE_PATHS = ("nightVision", "motionDetect", "soundDetect")
+
+
+class MarsStandIn:
+    """Local regist_gw_user endpoint answering every POST with a fresh token after `latency` seconds."""
+
+    def __init__(self, latency: float):
+        counter = itertools.count()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if latency:
+                    time.sleep(latency)
+                body = json.dumps({"code": "1", "data": {
+                    "accessId": "bench-" + self.path.rsplit("/", 1)[-1],
+                    "accessToken": f"token-{next(counter)}",
+                }}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def stop(self):
+        self.server.shutdown()
+
+
+class _ObjectListResponse:
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+
+
+class WyzeStandIn:
+    """Just enough of wyze_sdk.Client for the manager: a token and get_object_list()."""
+
+    _token = "bench-access-token"
+    _refresh_token = "bench-refresh-token"
+
+    def __init__(self, cameras: int, latency: float):
+        self.latency = latency
+        self.devices = [
+            {
+                "mac": f"GW_BENCH_{i:04d}",
+                "nickname": f"Bench Cam {i}",
+                "product_type": "Camera",
+                "product_model": "GW_GC1",
+                "ip": f"10.99.{i // 250}.{i % 250 + 1}",
+            }
+            for i in range(cameras)
+        ]
+
+    def _api_client(self):
+        return self
+
+    def get_object_list(self):
+        if self.latency:
+            time.sleep(self.latency)
+        return _ObjectListResponse({"code": "1", "data": {"device_list": self.devices}})
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed = time.perf_counter() - started
+        self.samples.setdefault(name, []).append(elapsed)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name, values in sorted(self.samples.items()):
+            values = sorted(values)
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors.get(name, 0),
+                "throughput": round(len(values) / wall, 1) if wall else 0.0,
+                "p50Ms": round(percentile(values, 50) * 1000, 2),
+                "p90Ms": round(percentile(values, 90) * 1000, 2),
+                "p99Ms": round(percentile(values, 99) * 1000, 2),
+                "maxMs": round(values[-1] * 1000, 2),
+            }
+        total = sum(len(v) for v in self.samples.values())
+        return {"wallSeconds": round(wall, 3), "requests": total,
+                "throughput": round(total / wall, 1) if wall else 0.0, "endpoints": endpoints}
+
+
+async def bounded(concurrency: int, jobs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            await job
+
+    await asyncio.gather(*(run(job) for job in jobs))
+
+
+def random_message(camera_id: str, message_type: str, burst: int, rng: random.Random) -> Tuple[str, str]:
+    """(path, body) shaped like what the Android app posts for this messageType."""
+    if message_type == "MSG_TYPE_PRO_WRITABLE":
+        return rng.choice(WRITABLE_PATHS), json.dumps({"setVal": rng.randint(0, 2), "stVal": rng.randint(0, 2), "t": burst})
+    if message_type == "MSG_TYPE_PRO_READONLY":
+        return rng.choice(READONLY_PATHS), json.dumps({"stVal": rng.randint(0, 100), "t": burst})
+    if message_type == "MSG_TYPE_PRO_CONST":
+        return "_productInfo", json.dumps({"productID": "GW_GC1", "serialNumber": camera_id})
+    return "_event", json.dumps({"alarmType": rng.randint(1, 4), "t": burst})
+
+
+def message_jobs(rec: Recorder, client: httpx.AsyncClient, camera_ids: List[str], bursts: int, rng: random.Random):
+    """Each burst: every camera posts one message of every messageType, in random order."""
+    jobs = []
+    for burst in range(bursts):
+        for camera_id in camera_ids:
+            for message_type in MESSAGE_TYPES:
+                path, body = random_message(camera_id, message_type, burst, rng)
+                jobs.append(rec.call(client, f"POST /CameraMessage {message_type}", "POST", "/CameraMessage",
+                                     params={"cameraId": camera_id, "messageType": message_type, "path": path},
+                                     content=body))
+    rng.shuffle(jobs)
+    return jobs
+
+
+def message_batch_jobs(rec: Recorder, client: httpx.AsyncClient, camera_ids: List[str], bursts: int, rng: random.Random):
+    """The same traffic as message_jobs, but each camera's burst goes out as one NDJSON batch."""
+    jobs = []
+    for burst in range(bursts):
+        for camera_id in camera_ids:
+            lines = []
+            for message_type in MESSAGE_TYPES:
+                path, body = random_message(camera_id, message_type, burst, rng)
+                lines.append(json.dumps({"cameraId": camera_id, "messageType": message_type, "path": path, "data": body}))
+            jobs.append(rec.call(client, "POST /CameraMessage/Batch", "POST", "/CameraMessage/Batch",
+                                 content="\n".join(lines), headers={"Content-Type": "application/x-ndjson"}))
+    rng.shuffle(jobs)
+    return jobs
+
+
+def token_jobs(rec: Recorder, client: httpx.AsyncClient, camera_ids: List[str], requests: int, rng: random.Random):
+    """A storm skewed toward a few hot cameras, like many streams restarting together."""
+    hot = camera_ids[:max(1, len(camera_ids) // 10)]
+    return [
+        rec.call(client, "GET /Camera/CameraToken", "GET", "/Camera/CameraToken",
+                 params={"deviceId": rng.choice(hot) if rng.random() < 0.5 else rng.choice(camera_ids)})
+        for _ in range(requests)
+    ]
+
+
+async def dashboard_poller(rec: Recorder, client: httpx.AsyncClient, polls: int, interval: float):
+    """One dashboard tab: page load, then periodic inventory (with ETag), message deltas and health."""
+    await rec.call(client, "GET /", "GET", "/")
+    etag = None
+    cursor = ""
+    for _ in range(polls):
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await rec.call(client, "GET /Camera/Inventory", "GET", "/Camera/Inventory", headers=headers)
+        if response is not None and response.headers.get("ETag"):
+            etag = response.headers["ETag"]
+        response = await rec.call(client, "GET /messages?since", "GET", "/messages", params={"since": cursor})
+        if response is not None and response.status_code == 200:
+            cursor = response.json()["cursor"]
+        await rec.call(client, "GET /health", "GET", "/health")
+        await asyncio.sleep(interval)
+
+
+async def run_scenarios(base_url: str, args, camera_ids: List[str]) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def scenario(name: str, make_jobs):
+            rec = Recorder()
+            started = time.perf_counter()
+            await make_jobs(rec)
+            results[name] = rec.report(time.perf_counter() - started)
+            print(f"  {name}: {results[name]['requests']} requests in {results[name]['wallSeconds']}s")
+
+        await scenario("messages", lambda rec: bounded(
+            args.concurrency, message_jobs(rec, client, camera_ids, args.message_bursts, rng)))
+        await scenario("messages_batch", lambda rec: bounded(
+            args.concurrency, message_batch_jobs(rec, client, camera_ids, args.message_bursts, rng)))
+        await scenario("token_storm", lambda rec: bounded(
+            args.concurrency, token_jobs(rec, client, camera_ids, args.token_requests, rng)))
+        await scenario("dashboard", lambda rec: asyncio.gather(*(
+            dashboard_poller(rec, client, args.dashboard_polls, args.dashboard_interval)
+            for _ in range(args.dashboards))))
+        await scenario("mixed", lambda rec: asyncio.gather(
+            bounded(args.concurrency, message_jobs(rec, client, camera_ids, args.message_bursts, rng)),
+            bounded(args.concurrency, token_jobs(rec, client, camera_ids, args.token_requests, rng)),
+            *(dashboard_poller(rec, client, args.dashboard_polls, args.dashboard_interval)
+              for _ in range(args.dashboards))))
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Prints per-endpoint deltas; returns False when any p99 or throughput regressed past threshold (%)."""
+    ok = True
+    print(f"\nvs baseline {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}), threshold {threshold:g}%")
+    for scenario, result in current["results"].items():
+        base = baseline["results"].get(scenario)
+        if not base:
+            continue
+        for name, stats in result["endpoints"].items():
+            old = base["endpoints"].get(name)
+            if not old:
+                continue
+            p99_delta = (stats["p99Ms"] - old["p99Ms"]) / old["p99Ms"] * 100 if old["p99Ms"] else 0.0
+            tput_delta = (stats["throughput"] - old["throughput"]) / old["throughput"] * 100 if old["throughput"] else 0.0
+            regressed = p99_delta > threshold or tput_delta < -threshold
+            ok = ok and not regressed
+            print(f"  {'REGRESSED' if regressed else 'ok':9s} {scenario:11s} {name:45s} "
+                  f"p99 {old['p99Ms']:8.2f} -> {stats['p99Ms']:8.2f} ms ({p99_delta:+6.1f}%)  "
+                  f"tput {old['throughput']:8.1f} -> {stats['throughput']:8.1f}/s ({tput_delta:+6.1f}%)")
+    return ok
+
+
+def print_report(results: Dict[str, Any]):
+    for scenario, result in results.items():
+        print(f"\n[{scenario}] {result['requests']} requests, {result['throughput']} req/s")
+        for name, s in result["endpoints"].items():
+            print(f"  {name:45s} n={s['requests']:6d} err={s['errors']:4d} {s['throughput']:8.1f}/s "
+                  f"p50={s['p50Ms']:8.2f} p90={s['p90Ms']:8.2f} p99={s['p99Ms']:8.2f} max={s['maxMs']:8.2f} ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=20)
+    parser.add_argument("--message-bursts", type=int, default=20, help="bursts of one message per type per camera")
+    parser.add_argument("--token-requests", type=int, default=200)
+    parser.add_argument("--dashboards", type=int, default=4, help="concurrent dashboard tabs")
+    parser.add_argument("--dashboard-polls", type=int, default=25)
+    parser.add_argument("--dashboard-interval", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=32, help="max in-flight requests per load generator")
+    parser.add_argument("--mars-latency", type=float, default=0.05, help="seconds per stand-in Mars call")
+    parser.add_argument("--wyze-latency", type=float, default=0.0, help="seconds per stand-in device list call")
+    parser.add_argument("--token-reservoir", type=int, default=0,
+                        help="TOKEN_RESERVOIR_SIZE for the run (0 = every token request hits Mars)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here (use as a later --baseline)")
+    parser.add_argument("--baseline", help="compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    # Configure the app before importing it: module-level constants read the environment
+    mars = MarsStandIn(args.mars_latency)
+    workdir = tempfile.mkdtemp(prefix="cryze-bench-")
+    os.makedirs(os.path.join(workdir, "data"))
+    os.chdir(workdir)
+    os.environ.update({
+        "MARS_URL": mars.url,
+        "WYZE_EMAIL": "bench@example.invalid",
+        "WYZE_PASSWORD": "bench",
+        "CAMERA_REFRESH_INTERVAL": "0",
+        "LAN_PROBE_INTERVAL": "0",
+        "EVENT_LOG_ENABLED": "false",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "TOKEN_RESERVOIR_SIZE": str(args.token_reservoir),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import uvicorn
+    import main as app_module
+
+    wyze = WyzeStandIn(args.cameras, args.wyze_latency)
+
+    def stand_in_login(resume: bool = True):
+        app_module.manager.client = wyze
+
+    app_module.manager.login = stand_in_login
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while httpx.get(f"{base_url}/health").status_code != 200 or len(app_module.manager.cameras) < args.cameras:
+        if time.time() > deadline:
+            sys.exit("app did not become ready")
+        time.sleep(0.05)
+
+    camera_ids = sorted(app_module.manager.cameras)
+    print(f"Benchmarking {base_url} with {len(camera_ids)} cameras (Mars latency {args.mars_latency}s)")
+    try:
+        results = asyncio.run(run_scenarios(base_url, args, camera_ids))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+        mars.stop()
+
+    document = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    print_report(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nWrote {output}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("params") != document["meta"]["params"]:
+            print("warning: baseline was recorded with different parameters")
+        if not compare(document, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,58 @@
+import asyncio
+import json
+from typing import Any, Optional, Set
+
+
+class EventBroker:
+    """Fans server-sent events out to connected /events clients.
+
+    Each event is serialized once and the same bytes are queued for every
+    subscriber. publish() is safe to call from worker threads. A subscriber that
+    falls too far behind gets its backlog replaced with a single `resync` event.
+    """
+
+    def __init__(self, max_queue: int = 256):
+        self.max_queue = max_queue
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    @staticmethod
+    def encode(event: str, data: Any) -> bytes:
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+
+    def publish(self, event: str, data: Any):
+        if self._loop is None or not self._subscribers:
+            return
+        frame = self.encode(event, data)
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fan_out(frame)
+        else:
+            self._loop.call_soon_threadsafe(self._fan_out, frame)
+
+    def _fan_out(self, frame: bytes):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.encode("resync", {}))
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
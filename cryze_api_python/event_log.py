@@ -0,0 +1,171 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("cryze_api.event_log")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    message_type TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON events (camera_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+"""
+
+# (ts, camera_id, message_type, key, value)
+EventRow = Tuple[float, str, str, str, str]
+
+
+class EventLog:
+    """Append-only SQLite (WAL) log of camera message updates.
+
+    append() only enqueues; a single background writer drains the queue and
+    commits in batches, so request latency never waits on disk. With WAL and
+    synchronous=NORMAL a commit doesn't fsync, and a crash loses at most the
+    last un-checkpointed batch while the database itself stays consistent —
+    startup needs no repair step.
+    """
+
+    def __init__(self, path: str, retention_days: float = 7, batch_size: int = 500,
+                 flush_interval: float = 1.0, max_queue: int = 50000):
+        self.path = path
+        self.retention_seconds = retention_days * 86400
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[EventRow]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        self.stats = {"written": 0, "dropped": 0, "batches": 0, "pruned": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self._thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Event log enabled at {self.path} (retention {self.retention_seconds / 86400:g} days)")
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def append(self, camera_id: str, message_type: str, updates: Dict[str, str], ts: Optional[float] = None):
+        if self._thread is None:
+            return
+        ts = time.time() if ts is None else ts
+        for key, value in updates.items():
+            try:
+                self._queue.put_nowait((ts, camera_id, message_type, key, value))
+            except queue.Full:
+                self.stats["dropped"] += 1
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            running = True
+            while running:
+                batch: List[EventRow] = []
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                    deadline = time.monotonic() + self.flush_interval
+                    while item is not None:
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        item = self._queue.get(timeout=remaining)
+                    if item is None:
+                        running = False
+                except queue.Empty:
+                    pass
+                try:
+                    if batch:
+                        with conn:
+                            conn.executemany(
+                                "INSERT INTO events (ts, camera_id, message_type, key, value) VALUES (?, ?, ?, ?, ?)",
+                                batch
+                            )
+                        self.stats["written"] += len(batch)
+                        self.stats["batches"] += 1
+                    self._maybe_prune(conn)
+                except sqlite3.Error as e:
+                    logger.error(f"Event log write failed, dropped {len(batch)} events: {e}")
+                    self.stats["dropped"] += len(batch)
+        finally:
+            conn.close()
+
+    def _maybe_prune(self, conn: sqlite3.Connection):
+        now = time.time()
+        if self.retention_seconds <= 0 or now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        with conn:
+            cur = conn.execute("DELETE FROM events WHERE ts < ?", (now - self.retention_seconds,))
+        self.stats["pruned"] += cur.rowcount
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def query(self, camera_id: Optional[str] = None, start: Optional[float] = None,
+              end: Optional[float] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        if camera_id:
+            clauses.append("camera_id = ?")
+            params.append(camera_id)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+        try:
+            rows = conn.execute(
+                f"SELECT ts, camera_id, message_type, key, value FROM events {where} ORDER BY ts DESC, id DESC LIMIT ?",
+                params
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"ts": ts, "cameraId": cam, "messageType": message_type, "key": key, "value": value}
+            for ts, cam, message_type, key, value in rows
+        ]
+
+    def latest_values(self, since: float) -> List[EventRow]:
+        """The newest row per (camera, key) written since `since`, oldest first — used to re-seed
+        the in-memory store at boot, so restore work is proportional to keys, not history."""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+        try:
+            return conn.execute(
+                "SELECT e.ts, e.camera_id, e.message_type, e.key, e.value FROM events e "
+                "JOIN (SELECT MAX(id) AS id FROM events WHERE ts >= ? GROUP BY camera_id, key) latest "
+                "ON e.id = latest.id ORDER BY e.ts, e.id",
+                (since,)
+            ).fetchall()
+        finally:
+            conn.close()
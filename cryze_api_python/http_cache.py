@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this aren't worth a compression round-trip
+MIN_COMPRESS_BYTES = 512
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    bare = etag[2:] if etag.startswith("W/") else etag
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or bare in candidates or f"W/{bare}" in candidates
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks br or gzip from an Accept-Encoding header (honouring q=0), preferring br."""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def _compress(data: bytes, encoding: str, best: bool) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+class CachedBody:
+    """A response body with its ETag and compressed variants, each compressed at most once.
+
+    `etag` defaults to a content hash. Weak ETags are used because the
+    gzip/br/identity representations share one tag.
+    """
+
+    __slots__ = ("body", "media_type", "etag", "_variants", "_lock")
+
+    def __init__(self, body: bytes, media_type: str, etag: Optional[str] = None, precompress: bool = False):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag or f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        if precompress and len(body) >= MIN_COMPRESS_BYTES:
+            for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+                self._variants[encoding] = _compress(body, encoding, best=True)
+
+    def variant(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        if encoding is None or len(self.body) < MIN_COMPRESS_BYTES:
+            return self.body, None
+        data = self._variants.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._variants.get(encoding)
+                if data is None:
+                    data = _compress(self.body, encoding, best=False)
+                    self._variants[encoding] = data
+        # Compression that doesn't pay off is skipped
+        if len(data) >= len(self.body):
+            return self.body, None
+        return data, encoding
+
+    def response(self, request: Request, cache_control: str = "no-cache") -> Response:
+        """200 with the negotiated encoding, or 304 when the client already has this ETag."""
+        headers = {"ETag": self.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request, self.etag):
+            return Response(status_code=304, headers=headers)
+        data, encoding = self.variant(negotiate_encoding(request.headers.get("accept-encoding")))
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=data, media_type=self.media_type, headers=headers)
+
+
+class VersionedCache:
+    """One CachedBody per name, rebuilt only when its version key changes."""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Hashable, CachedBody]] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, name: str, version: Hashable, build: Callable[[], CachedBody]) -> CachedBody:
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            cached = build()
+            self._entries[name] = (version, cached)
+            self.builds += 1
+            return cached
+
+
+def json_body(data: Any, etag: Optional[str] = None, precompress: bool = False) -> CachedBody:
+    return CachedBody(json.dumps(jsonable_encoder(data), separators=(",", ":")).encode(),
+                      "application/json", etag=etag, precompress=precompress)
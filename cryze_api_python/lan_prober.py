@@ -0,0 +1,169 @@
+import asyncio
+import errno
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("cryze_api.lan_prober")
+
+# A refused connection still proves the host answered on the LAN
+_ANSWERED_ERRNOS = {errno.ECONNREFUSED, errno.ECONNRESET}
+
+
+class ProbeResult:
+    __slots__ = ("ip", "reachable", "rtt", "checked_at", "error")
+
+    def __init__(self, ip: str, reachable: bool, rtt: Optional[float], checked_at: float, error: Optional[str] = None):
+        self.ip = ip
+        self.reachable = reachable
+        self.rtt = rtt
+        self.checked_at = checked_at
+        self.error = error
+
+
+class LanProber:
+    """Checks camera LAN IPs concurrently from the event loop.
+
+    Each IP gets a TCP connect to `port`; an accepted or refused connection
+    both count as reachable (the host answered) and the time to that answer is
+    the RTT. Results are cached per IP for `ttl` seconds, so cameras sharing an
+    address and repeated inventory changes don't re-probe. At most
+    `concurrency` probes run at once. `get_targets` returns
+    {cameraId: [(source, ip), ...]} and is read on every cycle.
+    """
+
+    def __init__(self, get_targets: Callable[[], Dict[str, List[tuple]]], port: int = 80,
+                 timeout: float = 1.0, concurrency: int = 16, interval: float = 60.0, ttl: float = 120.0):
+        self._get_targets = get_targets
+        self.port = port
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.ttl = ttl
+        self._cache: Dict[str, ProbeResult] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.probes = 0
+        self.last_cycle: Optional[float] = None
+
+    async def probe(self, ip: str) -> ProbeResult:
+        started = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, self.port), self.timeout)
+            rtt = time.monotonic() - started
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass  # the peer may reset a connection we never used
+            result = ProbeResult(ip, True, rtt, time.time())
+        except asyncio.TimeoutError:
+            result = ProbeResult(ip, False, None, time.time(), "timeout")
+        except OSError as e:
+            if e.errno in _ANSWERED_ERRNOS:
+                result = ProbeResult(ip, True, time.monotonic() - started, time.time())
+            else:
+                result = ProbeResult(ip, False, None, time.time(), e.strerror or type(e).__name__)
+        except ValueError as e:
+            # Malformed address (e.g. a manual IP like "a..b" fails IDNA encoding with UnicodeError)
+            result = ProbeResult(ip, False, None, time.time(), f"invalid address: {e}")
+        self.probes += 1
+        return result
+
+    async def probe_all(self, ips: List[str], force: bool = False) -> Dict[str, ProbeResult]:
+        """Probes every IP whose cached result is missing or expired (all of them with force)."""
+        now = time.time()
+        stale = [
+            ip for ip in dict.fromkeys(ips)
+            if force or ip not in self._cache or now - self._cache[ip].checked_at >= self.interval
+        ]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(ip: str):
+            async with semaphore:
+                self._cache[ip] = await self.probe(ip)
+
+        if stale:
+            await asyncio.gather(*(bounded(ip) for ip in stale))
+        return {ip: self._cache[ip] for ip in ips if ip in self._cache}
+
+    async def run_once(self, force: bool = False):
+        targets = self._get_targets()
+        ips = [ip for paths in targets.values() for _, ip in paths]
+        await self.probe_all(ips, force=force)
+        live = set(ips)
+        for ip in [ip for ip in self._cache if ip not in live]:
+            del self._cache[ip]
+        self.cycles += 1
+        self.last_cycle = time.time()
+        unreachable = sum(1 for ip in live if not self._cache[ip].reachable)
+        if unreachable:
+            logger.info(f"LAN probe: {unreachable}/{len(live)} camera IPs unreachable")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"LAN probe cycle failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Starts the probe loop on the running event loop. An interval of 0 disables probing."""
+        if self._task is not None or self.interval <= 0:
+            return self._task
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        return self._task
+
+    def trigger(self):
+        """Wakes the loop early, e.g. after an inventory change. Safe from any thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def result(self, ip: Optional[str]) -> Optional[ProbeResult]:
+        """The cached result for ip, or None when it was never probed or has expired."""
+        if not ip:
+            return None
+        result = self._cache.get(ip)
+        if result is None or time.time() - result.checked_at >= self.ttl:
+            return None
+        return result
+
+    def rank(self, paths: List[tuple]) -> List[Dict[str, Any]]:
+        """Orders (source, ip) candidates: reachable by RTT, then not yet probed, then unreachable."""
+        ranked = []
+        for source, ip in paths:
+            result = self.result(ip)
+            ranked.append({
+                "ip": ip,
+                "source": source,
+                "reachable": result.reachable if result else None,
+                "rttMs": round(result.rtt * 1000, 2) if result and result.rtt is not None else None,
+                "checkedAt": result.checked_at if result else None,
+                "error": result.error if result else None,
+            })
+        order = {True: 0, None: 1, False: 2}
+        ranked.sort(key=lambda p: (order[p["reachable"]], p["rttMs"] if p["rttMs"] is not None else float("inf")))
+        return ranked
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        fresh = [r for r in list(self._cache.values()) if now - r.checked_at < self.ttl]
+        return {
+            "port": self.port,
+            "intervalSeconds": self.interval,
+            "ttlSeconds": self.ttl,
+            "cycles": self.cycles,
+            "probes": self.probes,
+            "lastCycle": self.last_cycle,
+            "reachable": sum(1 for r in fresh if r.reachable),
+            "unreachable": sum(1 for r in fresh if not r.reachable),
+        }
@@ -0,0 +1,211 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Record attributes that identify a rate-limited stream, passed via `extra=`
+RATE_KEY_FIELDS = ("cameraId", "messageType")
+# Extra record attributes copied into JSON output when present
+CONTEXT_FIELDS = RATE_KEY_FIELDS + ("path", "suppressed")
+# Libraries that are very chatty at DEBUG and run inline on request threads
+NOISY_LOGGERS = ("urllib3", "wyze_sdk", "httpx", "httpcore", "asyncio")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most `limit` records per (cameraId, messageType) per `window` seconds.
+
+    Records without those attributes are never limited. The first record let
+    through after a suppressed stretch carries `suppressed=N` so the drop is
+    visible in the output; streams that go quiet instead are reported by
+    flush(), which the pipeline's listener calls every window.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[Any, ...], list] = {}  # key -> [window_start, count, suppressed]
+        self.suppressed_total = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = tuple(getattr(record, field, None) for field in RATE_KEY_FIELDS)
+        if key == (None,) * len(RATE_KEY_FIELDS):
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = bucket[2] if bucket else 0
+                self._buckets[key] = [now, 1, 0]
+                if len(self._buckets) > 4096:
+                    self._prune(now)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if bucket[1] < self.limit:
+                bucket[1] += 1
+                return True
+            bucket[2] += 1
+            self.suppressed_total += 1
+            return False
+
+    def flush(self, force: bool = False) -> List[logging.LogRecord]:
+        """Summary records for streams whose window has expired with records still suppressed
+        (every stream when `force`). Their buckets are dropped, so each count is reported once."""
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for key, bucket in list(self._buckets.items()):
+                if not force and now - bucket[0] < self.window:
+                    continue
+                del self._buckets[key]
+                if bucket[2]:
+                    summaries.append(self._summary(key, bucket[2]))
+        return summaries
+
+    @staticmethod
+    def _summary(key: Tuple[Any, ...], suppressed: int) -> logging.LogRecord:
+        record = logging.LogRecord("cryze_api.log_pipeline", logging.INFO, __file__, 0,
+                                   f"Suppressed {suppressed} log records", None, None)
+        for field, value in zip(RATE_KEY_FIELDS, key):
+            setattr(record, field, value)
+        record.suppressed = suppressed
+        return record
+
+    def _prune(self, now: float):
+        for key in [k for k, b in self._buckets.items() if now - b[0] >= self.window]:
+            del self._buckets[key]
+
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: when the queue is full the record is dropped and counted."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve args and tracebacks here, but leave the exception text separate from the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that also writes the rate limiter's pending suppression summaries at least
+    once per window, whether or not new records arrive."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler, rate_limiter: RateLimitFilter):
+        super().__init__(log_queue, *handlers, respect_handler_level=False)
+        self.rate_limiter = rate_limiter
+        self._next_flush = time.monotonic() + rate_limiter.window
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if not block or self.rate_limiter.limit <= 0 or self.rate_limiter.window <= 0:
+            return super().dequeue(block)
+        while True:
+            wait = self._next_flush - time.monotonic()
+            if wait > 0:
+                try:
+                    return self.queue.get(timeout=wait)
+                except queue.Empty:
+                    pass
+            self._next_flush = time.monotonic() + self.rate_limiter.window
+            self.flush()
+
+    def flush(self, force: bool = False):
+        for record in self.rate_limiter.flush(force):
+            self.handle(record)
+
+
+class LogPipeline:
+    """Root logging routed through a bounded queue to a single writer thread.
+
+    Request threads only filter and enqueue; formatting and the stdout write
+    (the part that can stall behind Docker's log driver) happen on the
+    listener thread.
+    """
+
+    def __init__(self, level: str = "DEBUG", fmt: str = "json", rate_limit: int = 20,
+                 rate_window: float = 10.0, queue_size: int = 10000, library_level: str = "WARNING"):
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.rate_limiter = RateLimitFilter(rate_limit, rate_window)
+        self.handler.addFilter(self.rate_limiter)
+
+        output = logging.StreamHandler(sys.stdout)
+        if fmt == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        self.listener = FlushingQueueListener(self.queue, output, rate_limiter=self.rate_limiter)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        root.setLevel(level.upper())
+        for name in NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(library_level.upper())
+        self.listener.start()
+
+    def stop(self):
+        self.listener.stop()
+        # Nothing will report the counts of streams still mid-window otherwise
+        self.listener.flush(force=True)
+
+    def set_level(self, level: str, logger_name: Optional[str] = None):
+        """Changes a logger's level at runtime (the root logger when no name is given)."""
+        logging.getLogger(logger_name).setLevel(level.upper())
+
+    def status(self) -> Dict[str, Any]:
+        levels = {"root": logging.getLevelName(logging.getLogger().level)}
+        for name in NOISY_LOGGERS:
+            levels[name] = logging.getLevelName(logging.getLogger(name).getEffectiveLevel())
+        return {
+            "levels": levels,
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "rateLimit": {"limit": self.rate_limiter.limit, "windowSeconds": self.rate_limiter.window},
+            "suppressed": self.rate_limiter.suppressed_total,
+        }
@@ -1,19 +1,45 @@
 
 import os
-import sys
 import logging
 import asyncio
-from typing import List, Optional, Dict, Any
+import threading
+import time
+import uuid
+from types import MappingProxyType
+from typing import List, Optional, Dict, Any, Tuple, Callable, Set, Mapping
 import json
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Query
-from fastapi.responses import HTMLResponse
+import math
+from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse, PlainTextResponse
+import anyio.to_thread
 from pydantic import BaseModel
 from wyze_sdk import Client
-from wyze_sdk.errors import WyzeClientError
-from wyze_sdk.service.base import WpkNetServiceClient
-import requests
+from wyze_sdk.errors import WyzeClientError, WyzeApiError
+from wyze_sdk.service.base import BaseServiceClient, WpkNetServiceClient
+import httpx
 import hashlib
 import wyze_sdk.signature
+from message_store import MessageStore
+from event_log import EventLog
+from event_broker import EventBroker
+from metrics import Registry
+from log_pipeline import LogPipeline
+from lan_prober import LanProber
+from refresh_scheduler import RefreshScheduler
+from p2p_servers import ServerDirectory
+from http_cache import CachedBody, VersionedCache, etag_matches, json_body
+from state_backend import LeaderLock, LocalBackend, create_backend
+from state_sync import StateSync
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, DeadlineMiddleware, budget
+from tokens import AccessCredential, SharedTokenReservoir, TokenReservoir, TokenScheduler
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # optional; the stdlib parser accepts the same input
+    orjson = None
+    _json_loads = json.loads
 
 # Monkey-patch: wyze_sdk's md5_string passes non-bytes to hashlib.md5()
 def _patched_md5_string(self, body):
@@ -23,16 +49,60 @@ def _patched_md5_string(self, body):
 
 wyze_sdk.signature.RequestVerifier.md5_string = _patched_md5_string
 
+# Monkey-patch: wyze_sdk sends every request without a timeout (BaseServiceClient.timeout is never
+# passed on), so a degraded Wyze cloud would block the calling thread indefinitely. Each send is
+# bounded by WYZE_TIMEOUT and whatever is left of the current request deadline.
+_original_do_request = BaseServiceClient._do_request
 
+def _do_request_with_timeout(self, session, request):
+    send = session.send
+    session.send = lambda prepared, **kwargs: send(prepared, **{**kwargs, "timeout": budget(WYZE_TIMEOUT)})
+    return _original_do_request(self, session, request)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    stream=sys.stdout
+BaseServiceClient._do_request = _do_request_with_timeout
+
+
+
+# Configure logging — records are queued and written by a background thread (see log_pipeline.py)
+log_pipeline = LogPipeline(
+    level=os.getenv("LOG_LEVEL", "DEBUG"),
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    rate_limit=int(os.getenv("LOG_RATE_LIMIT", "20")),
+    rate_window=float(os.getenv("LOG_RATE_WINDOW", "10")),
+    queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    library_level=os.getenv("LOG_LIBRARY_LEVEL", "WARNING")
 )
 logger = logging.getLogger("cryze_api")
 
+# Metrics — children are cached per label set, so the hot paths only do a dict lookup and an add
+metrics = Registry()
+MARS_TOKEN_SECONDS = metrics.histogram("cryze_mars_token_seconds", "Latency of Mars regist_gw_user calls", ["camera"])
+MARS_TOKEN_ERRORS = metrics.counter("cryze_mars_token_errors_total", "Failed Mars token calls by error code", ["camera", "code"])
+REFRESH_SECONDS = metrics.histogram("cryze_camera_refresh_seconds", "Duration of refresh_cameras", ["result"])
+WYZE_DEVICES = metrics.gauge("cryze_wyze_devices", "Devices in the last Wyze device list")
+CIRCUIT_STATE = metrics.gauge("cryze_circuit_state", "Outbound circuit breaker state (0 closed, 1 half-open, 2 open)", ["endpoint"])
+CAMERA_MESSAGES = metrics.counter("cryze_camera_messages_total", "Camera messages received", ["message_type"])
+THREADPOOL_BUSY = metrics.gauge("cryze_threadpool_busy", "Worker threads in use by sync endpoints and to_thread calls")
+THREADPOOL_SIZE = metrics.gauge("cryze_threadpool_size", "Worker thread limit")
+EVENT_LOOP_LAG = metrics.histogram(
+    "cryze_event_loop_lag_seconds", "How late a periodic event loop wakeup ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_PROBE_INTERVAL = 0.5
+# Label values that come from request parameters are limited to known ones, or every
+# made-up deviceId/messageType would add a series that is cached forever
+KNOWN_MESSAGE_TYPES = frozenset({
+    "MSG_TYPE_EVENT", "MSG_TYPE_PRO_CONST", "MSG_TYPE_PRO_READONLY", "MSG_TYPE_PRO_WRITABLE",
+    "MSG_TYPE_ACTION", "MSG_TYPE_UNKNOWN",
+})
+OTHER_LABEL = "other"
+
+def camera_label(device_id: str) -> str:
+    return device_id if device_id in manager.cameras else OTHER_LABEL
+
+def message_type_label(message_type: str) -> str:
+    return message_type if message_type in KNOWN_MESSAGE_TYPES else OTHER_LABEL
+
 app = FastAPI()
 
 # CORS Middlewareation
@@ -44,6 +114,55 @@ MARS_URL = os.getenv("MARS_URL", "https://wyze-mars-service.wyzecam.com") # Defa
 MARS_REGISTER_GW_USER_ROUTE = os.getenv("MARS_REGISTER_GW_USER_ROUTE", "/plugin/mars/v2/regist_gw_user/")
 # Original C# defaults: GW_BE1_, GW_GC1_, GW_GC2_. Using broader GW_ to catch all GWELL variants (DUO, etc.)
 VALID_MARS_DEVICE_PREFIX = os.getenv("VALID_MARS_DEVICE_PREFIX", "GW_") # Comma separated
+# Camera message store — per-key history length and approximate memory budget
+MESSAGE_HISTORY_SIZE = int(os.getenv("MESSAGE_HISTORY_SIZE", "16"))
+MESSAGE_STORE_MAX_BYTES = int(os.getenv("MESSAGE_STORE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Most messages accepted by one POST /CameraMessage/Batch
+MESSAGE_BATCH_MAX = int(os.getenv("MESSAGE_BATCH_MAX", "5000"))
+# Durable camera event log (SQLite, WAL) — off unless EVENT_LOG_ENABLED is set
+EVENT_LOG_ENABLED = os.getenv("EVENT_LOG_ENABLED", "false").lower() in ("1", "true", "yes")
+EVENT_LOG_PATH = os.getenv("EVENT_LOG_PATH", "data/events.db")
+EVENT_LOG_RETENTION_DAYS = float(os.getenv("EVENT_LOG_RETENTION_DAYS", "7"))
+EVENT_LOG_RESTORE_HOURS = float(os.getenv("EVENT_LOG_RESTORE_HOURS", "24"))
+# Periodic camera refresh (seconds). 0 = only at startup and on POST /Camera/GetAllSupportedCameras
+CAMERA_REFRESH_INTERVAL = float(os.getenv("CAMERA_REFRESH_INTERVAL", "900"))
+CAMERA_REFRESH_RETRY_BASE = float(os.getenv("CAMERA_REFRESH_RETRY_BASE", "30"))
+CAMERA_REFRESH_RETRY_MAX = float(os.getenv("CAMERA_REFRESH_RETRY_MAX", "900"))
+# LAN reachability probing of camera IPs (TCP connect; a refused connection counts as reachable)
+LAN_PROBE_INTERVAL = float(os.getenv("LAN_PROBE_INTERVAL", "60"))
+LAN_PROBE_TTL = float(os.getenv("LAN_PROBE_TTL", "180"))
+LAN_PROBE_PORT = int(os.getenv("LAN_PROBE_PORT", "80"))
+LAN_PROBE_TIMEOUT = float(os.getenv("LAN_PROBE_TIMEOUT", "1.0"))
+LAN_PROBE_CONCURRENCY = int(os.getenv("LAN_PROBE_CONCURRENCY", "16"))
+# Shared state for running several uvicorn workers: "local" (single worker) or "sqlite"
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "data/state.db")
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", "0.25"))
+LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", "data/leader.lock")
+# Directory of saved GWELL p2pSave/*.p2p blobs (or logcat dumps) to decode P2P servers from
+P2P_SAVE_DIR = os.getenv("P2P_SAVE_DIR", "data/p2pSave")
+# Mars HTTP pool — one keep-alive pool shared by every token request
+MARS_CONNECT_TIMEOUT = float(os.getenv("MARS_CONNECT_TIMEOUT", "5"))
+MARS_READ_TIMEOUT = float(os.getenv("MARS_READ_TIMEOUT", "15"))
+MARS_MAX_CONNECTIONS = int(os.getenv("MARS_MAX_CONNECTIONS", "20"))
+MARS_KEEPALIVE_EXPIRY = float(os.getenv("MARS_KEEPALIVE_EXPIRY", "120"))
+# Token reservoir — pre-minted single-use tokens per camera. 0 disables it.
+TOKEN_RESERVOIR_SIZE = int(os.getenv("TOKEN_RESERVOIR_SIZE", "0"))
+TOKEN_RESERVOIR_MAX_AGE = float(os.getenv("TOKEN_RESERVOIR_MAX_AGE", "300"))  # seconds
+TOKEN_RESERVOIR_REFILL_INTERVAL = float(os.getenv("TOKEN_RESERVOIR_REFILL_INTERVAL", "15"))  # seconds
+# Token scheduler — caps parallel Mars calls and retries failures with jittered backoff
+MARS_MAX_CONCURRENCY = int(os.getenv("MARS_MAX_CONCURRENCY", "4"))
+MARS_MAX_ATTEMPTS = int(os.getenv("MARS_MAX_ATTEMPTS", "3"))
+MARS_BACKOFF_BASE = float(os.getenv("MARS_BACKOFF_BASE", "0.5"))  # seconds
+MARS_BACKOFF_MAX = float(os.getenv("MARS_BACKOFF_MAX", "8"))  # seconds
+# Outbound resilience: per-endpoint circuit breakers for Wyze/Mars, and a deadline per incoming request
+# (X-Request-Timeout header, else REQUEST_DEADLINE) that caps the timeouts of the calls it makes
+WYZE_TIMEOUT = float(os.getenv("WYZE_TIMEOUT", "15"))  # seconds per Wyze API request
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # seconds
+CIRCUIT_MAX_RESET_TIMEOUT = float(os.getenv("CIRCUIT_MAX_RESET_TIMEOUT", "300"))  # seconds
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))  # seconds, 0 = none
+REQUEST_DEADLINE_MAX = float(os.getenv("REQUEST_DEADLINE_MAX", "120"))  # seconds
 
 # Models
 class CameraInfo(BaseModel):
@@ -51,10 +170,6 @@ class CameraInfo(BaseModel):
     streamName: Optional[str] = None
     lanIp: Optional[str] = None
 
-class AccessCredential(BaseModel):
-    accessId: str
-    accessToken: str
-
 class CameraMessage(BaseModel):
     cameraId: str
     messageType: str
@@ -63,50 +178,300 @@ class CameraMessage(BaseModel):
 
 # Global State
 
-# Manual IP Persistence
+def write_json_atomic(path: str, data: Any, mode: int = 0o644):
+    """Writes JSON to a temp file created with `mode`, fsyncs it, then renames it over `path`."""
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    # `mode` only applies on creation; a .tmp left behind by a crash keeps whatever it had
+    os.fchmod(fd, mode)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+class CoalescingWriter:
+    """Debounces writes of one JSON file: rapid mark_dirty() calls collapse into a single
+    background write `delay` seconds after the first, always of the latest state."""
+
+    def __init__(self, path: str, get_data: Callable[[], Any], delay: float = 0.5, mode: int = 0o644):
+        self.path = path
+        self._get_data = get_data
+        self.delay = delay
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.writes = 0
+
+    def mark_dirty(self):
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        with self._write_lock:
+            try:
+                write_json_atomic(self.path, self._get_data(), mode=self.mode)
+                self.writes += 1
+            except Exception as e:
+                logger.error(f"Failed to write {self.path}: {e}")
+
+# User overrides — manual IPs plus cameras added/deleted through the API, applied on top of every refresh
+OVERRIDES_FILE = os.getenv("OVERRIDES_FILE", "data/overrides.json")
+# Pre-overrides location of manual IPs; imported once if overrides.json doesn't exist yet
 MANUAL_IPS_FILE = "data/manual_ips.json"
+OVERRIDES_FLUSH_DELAY = float(os.getenv("OVERRIDES_FLUSH_DELAY", "0.5"))
+
+class Overrides(BaseModel):
+    manualIps: Dict[str, str] = {}
+    cameras: List[CameraInfo] = []
+    deleted: List[str] = []
+
+def load_json_file(path: str) -> Optional[Any]:
+    """Loads JSON from path. A corrupt file is moved aside (never silently treated as empty)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to load {path}: {e}. Moved to {move_aside(path, 'corrupt')}")
+    return None
 
-def load_manual_ips() -> Dict[str, str]:
-    if os.path.exists(MANUAL_IPS_FILE):
+def move_aside(path: str, reason: str) -> str:
+    """Renames an unusable file to <path>.<reason>-<ts> so the next write can't overwrite it."""
+    aside = f"{path}.{reason}-{int(time.time())}"
+    try:
+        os.replace(path, aside)
+    except OSError:
+        pass
+    return aside
+
+def load_overrides() -> Overrides:
+    data = load_json_file(OVERRIDES_FILE)
+    if data is not None:
+        try:
+            return Overrides(**data)
+        except Exception as e:
+            # Keep the user's file: the next coalesced flush would otherwise replace it with empty overrides
+            logger.error(f"Invalid overrides in {OVERRIDES_FILE}: {e}. Moved to {move_aside(OVERRIDES_FILE, 'invalid')}")
+    manual_ips = load_json_file(MANUAL_IPS_FILE)
+    if isinstance(manual_ips, dict):
+        logger.info(f"Importing {len(manual_ips)} manual IPs from {MANUAL_IPS_FILE}")
+        return Overrides(manualIps=manual_ips)
+    return Overrides()
+
+# Wyze session persistence — lets a restart reuse the access/refresh token instead of a full login
+WYZE_SESSION_FILE = os.getenv("WYZE_SESSION_FILE", "data/wyze_session.json")
+# Proactively rotate a persisted access token older than this (seconds)
+WYZE_SESSION_REFRESH_AFTER = float(os.getenv("WYZE_SESSION_REFRESH_AFTER", str(12 * 3600)))
+
+def load_wyze_session() -> Optional[Dict[str, Any]]:
+    if os.path.exists(WYZE_SESSION_FILE):
         try:
-            with open(MANUAL_IPS_FILE, 'r') as f:
-                return json.load(f)
+            with open(WYZE_SESSION_FILE, 'r') as f:
+                session = json.load(f)
+            if session.get("email") == WYZE_EMAIL and session.get("accessToken") and session.get("refreshToken"):
+                return session
+            logger.info("Ignoring persisted Wyze session for a different account")
         except Exception as e:
-            logger.error(f"Failed to load manual IPs: {e}")
-    return {}
+            logger.error(f"Failed to load Wyze session: {e}")
+    return None
 
-def save_manual_ips(ips: Dict[str, str]):
+def save_wyze_session(client: Client):
     try:
-        with open(MANUAL_IPS_FILE, 'w') as f:
-            json.dump(ips, f, indent=2)
+        # Created 0600 from the start so the tokens are never world-readable, even briefly
+        write_json_atomic(WYZE_SESSION_FILE, {
+            "email": WYZE_EMAIL,
+            "accessToken": client._token,
+            "refreshToken": client._refresh_token,
+            "savedAt": time.time()
+        }, mode=0o600)
     except Exception as e:
-        logger.error(f"Failed to save manual IPs: {e}")
+        logger.error(f"Failed to save Wyze session: {e}")
+
+class SessionUnavailable(Exception):
+    """A follower worker has no Wyze session to use yet (the leader hasn't persisted one)."""
+
+def is_token_error(data: Any) -> bool:
+    """True for Wyze/Mars responses that mean the access token expired."""
+    if not isinstance(data, dict):
+        return False
+    return str(data.get("code")) == "2001" or data.get("msg") == "AccessTokenError"
+
+# Last-known inventory, served at boot until the first live refresh completes
+INVENTORY_SNAPSHOT_FILE = os.getenv("INVENTORY_SNAPSHOT_FILE", "data/inventory.json")
+
+def load_inventory_snapshot() -> Optional[Dict[str, CameraInfo]]:
+    """The persisted inventory before overrides (the served one for snapshots that predate baseCameras)."""
+    if os.path.exists(INVENTORY_SNAPSHOT_FILE):
+        try:
+            with open(INVENTORY_SNAPSHOT_FILE, 'r') as f:
+                snapshot = json.load(f)
+            return {c["cameraId"]: CameraInfo(**c) for c in snapshot.get("baseCameras", snapshot["cameras"])}
+        except Exception as e:
+            logger.error(f"Failed to load inventory snapshot: {e}")
+    return None
+
+def inventory_snapshot_document(cameras: Mapping[str, CameraInfo], base: Mapping[str, CameraInfo]) -> Dict[str, Any]:
+    return {
+        "savedAt": time.time(),
+        "cameras": jsonable_encoder(list(cameras.values())),
+        # Before overrides, so overrides changed while serving the snapshot apply cleanly
+        "baseCameras": jsonable_encoder(list(base.values()))
+    }
 
 class ManualIPRequest(BaseModel):
     cameraId: str
     ip: str
 
+class LanPath(BaseModel):
+    ip: str
+    source: str  # manual | added | cloud | snapshot
+    reachable: Optional[bool] = None  # None until probed (or when the result has expired)
+    rttMs: Optional[float] = None
+    checkedAt: Optional[float] = None
+    error: Optional[str] = None
+
+class DeviceInfo(CameraInfo):
+    # Fastest reachable LAN path, falling back to lanIp when nothing has been confirmed
+    preferredIp: Optional[str] = None
+    # A manual override differs from the IP the cloud reports
+    ipMismatch: bool = False
+    lanPaths: List[LanPath] = []
+
+def diff_cameras(old: Mapping[str, CameraInfo], new: Mapping[str, CameraInfo]) -> Dict[str, List[str]]:
+    return {
+        "added": [cid for cid in new if cid not in old],
+        "removed": [cid for cid in old if cid not in new],
+        "changed": [cid for cid, cam in new.items() if cid in old and old[cid] != cam],
+    }
+
+
+CIRCUIT_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+def new_circuit_breaker(name: str) -> CircuitBreaker:
+    CIRCUIT_STATE.labels(name).set(0)
+    return CircuitBreaker(
+        name,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        max_reset_timeout=CIRCUIT_MAX_RESET_TIMEOUT,
+        on_state_change=lambda endpoint, state: CIRCUIT_STATE.labels(endpoint).set(CIRCUIT_STATE_VALUES[state])
+    )
+
 # Update WyzeManager to include manual IP logic
 class WyzeManager:
-    def __init__(self):
+    def __init__(self, state: Optional[LocalBackend] = None):
         self.client: Optional[Client] = None
-        self.cameras: Dict[str, CameraInfo] = {}
-        self.manual_ips: Dict[str, str] = load_manual_ips()
+        # Where inventory/overrides are shared with other workers (LocalBackend = this process only)
+        self.state = state or LocalBackend()
+        # Only the elected worker logs in, refreshes from Wyze and writes the local JSON files
+        self.is_leader = True
+        # Copy-on-write inventory: (version, read-only mapping) swapped as one object, so readers
+        # never see a half-applied update. Writers serialize on _inventory_lock. The version is
+        # bumped on every real change and lets clients poll /Camera/Inventory conditionally.
+        self._snapshot: Tuple[int, Mapping[str, CameraInfo]] = (0, MappingProxyType({}))
+        # Distinguishes inventory versions across restarts, since the counter starts over at 0
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._inventory_lock = threading.Lock()
+        self._inventory_listeners: List[Callable[[int, Mapping[str, CameraInfo], Dict[str, List[str]]], None]] = []
+        # User overrides, layered over every cloud refresh by _apply_overrides
+        overrides = load_overrides()
+        self._overrides_lock = threading.Lock()
+        self.manual_ips: Dict[str, str] = dict(overrides.manualIps)
+        self.added_cameras: Dict[str, CameraInfo] = {c.cameraId: c for c in overrides.cameras}
+        self.deleted_cameras: Set[str] = set(overrides.deleted)
+        self._overrides_version = 0
+        self._overrides_writer = CoalescingWriter(
+            OVERRIDES_FILE, lambda: jsonable_encoder(self.export_overrides()), delay=OVERRIDES_FLUSH_DELAY
+        )
+        # Last cloud device list with cloud IPs, the base that overrides are applied to
+        self._cloud_cameras: Dict[str, CameraInfo] = {}
+        # The boot snapshot before overrides; the base instead of _cloud_cameras until the first refresh
+        self._snapshot_cameras: Dict[str, CameraInfo] = {}
         # NO token cache — tokens are ONE-TIME USE per the original C# implementation.
         # The IoTVideoSdk is very picky about this. Caching causes ASrv_tmpsubs_parse_fail (8020).
         self.supported_prefixes = [p.strip() for p in VALID_MARS_DEVICE_PREFIX.split(",") if p.strip()]
         self._ready = False  # Set True after startup prefetch completes
-
-    def login(self):
+        # Where the served inventory came from: "empty", "snapshot" (disk, possibly stale) or "cloud"
+        self.inventory_source = "empty"
+        # Signing state (WpkNetServiceClient + RequestVerifier) is reused across token calls
+        # and only rebuilt when the Wyze access token changes.
+        self._wpk: Optional[WpkNetServiceClient] = None
+        self._auth_lock = threading.Lock()
+        self._mars_http: Optional[httpx.AsyncClient] = None
+        # One breaker per upstream endpoint: an auth outage shouldn't block token minting and vice versa
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: new_circuit_breaker(name) for name in ("wyze_auth", "wyze_devices", "mars")
+        }
+        self.token_scheduler = TokenScheduler(
+            self._fetch_token_from_mars_async,
+            max_concurrency=MARS_MAX_CONCURRENCY,
+            max_attempts=MARS_MAX_ATTEMPTS,
+            backoff_base=MARS_BACKOFF_BASE,
+            backoff_max=MARS_BACKOFF_MAX
+        )
+        # With a shared backend every worker takes from the tokens the leader mints
+        self.token_reservoir = (
+            SharedTokenReservoir(
+                self.state,
+                self.token_scheduler.fetch,
+                size=TOKEN_RESERVOIR_SIZE,
+                max_age=TOKEN_RESERVOIR_MAX_AGE,
+                refill_interval=TOKEN_RESERVOIR_REFILL_INTERVAL
+            ) if self.state.shared else TokenReservoir(
+                self.token_scheduler.fetch,
+                size=TOKEN_RESERVOIR_SIZE,
+                max_age=TOKEN_RESERVOIR_MAX_AGE,
+                refill_interval=TOKEN_RESERVOIR_REFILL_INTERVAL
+            )
+        )
+        self.refresh_scheduler = RefreshScheduler(
+            self.refresh_cameras,
+            interval=CAMERA_REFRESH_INTERVAL,
+            retry_base=CAMERA_REFRESH_RETRY_BASE,
+            retry_max=CAMERA_REFRESH_RETRY_MAX
+        )
+
+    @property
+    def cameras(self) -> Mapping[str, CameraInfo]:
+        return self._snapshot[1]
+
+    @property
+    def inventory_version(self) -> int:
+        return self._snapshot[0]
+
+    def login(self, resume: bool = True):
         if not self.client:
             if not WYZE_EMAIL or not WYZE_PASSWORD:
                 logger.error("WYZE_EMAIL or WYZE_PASSWORD not set")
                 return
+
+            if resume and self._resume_session():
+                return
             
             try:
                 logger.info(f"Attempting login for {WYZE_EMAIL}")
-                self.client = Client(email=WYZE_EMAIL, password=WYZE_PASSWORD, key_id=API_ID, api_key=API_KEY)
+                with self.breakers["wyze_auth"].guard():
+                    self.client = Client(email=WYZE_EMAIL, password=WYZE_PASSWORD, key_id=API_ID, api_key=API_KEY)
                 logger.info("Login successful")
+                save_wyze_session(self.client)
+            except (CircuitOpenError, DeadlineExceeded) as e:
+                logger.warning(f"Skipping Wyze login: {e}")
+                self.client = None
             except WyzeClientError as e:
                 logger.error(f"Failed to login: {e}")
                 self.client = None
@@ -114,33 +479,103 @@ class WyzeManager:
                 logger.exception(f"Unexpected error during login: {e}")
                 self.client = None
 
-    def refresh_cameras(self):
+    def _resume_session(self) -> bool:
+        """Reuses the persisted access token, rotating it first if it is old. False means a full login is needed."""
+        session = load_wyze_session()
+        if not session:
+            return False
+        client = Client(token=session["accessToken"], refresh_token=session["refreshToken"], key_id=API_ID, api_key=API_KEY)
+        age = time.time() - session.get("savedAt", 0)
+        if age > WYZE_SESSION_REFRESH_AFTER and not self._rotate_token(client):
+            return False
+        self.client = client
+        logger.info(f"Resumed persisted Wyze session for {WYZE_EMAIL} (token age {age / 3600:.1f}h)")
+        return True
+
+    def _rotate_token(self, client: Client) -> bool:
+        try:
+            with self.breakers["wyze_auth"].guard():
+                client.refresh_token()
+            save_wyze_session(client)
+            logger.info("Wyze access token refreshed")
+            return True
+        except Exception as e:
+            logger.warning(f"Wyze token refresh failed, full login required: {e}")
+            return False
+
+    def adopt_session(self) -> bool:
+        """Follower workers use the session the leader persisted, never rotating it themselves."""
+        session = load_wyze_session()
+        if not session or (self.client is not None and self.client._token == session["accessToken"]):
+            return False
+        self.client = Client(token=session["accessToken"], refresh_token=session["refreshToken"], key_id=API_ID, api_key=API_KEY)
+        logger.info("Using the Wyze session persisted by the leader worker")
+        return True
+
+    def handle_expired_token(self, expired_token: Optional[str]):
+        """Called after Wyze rejects `expired_token`: rotates it via the refresh token, or falls back to a full login."""
+        if not self.is_leader:
+            # The leader owns the session: ask it to rotate, the new token is adopted on the next sync
+            self.state.write("auth_expired", expired_token)
+            return
+        with self._auth_lock:
+            if not self.client or self.client._token != expired_token:
+                return  # already replaced by another caller
+            if self._rotate_token(self.client):
+                return
+            self.client = None
+            self.login(resume=False)
+
+    def refresh_cameras(self) -> bool:
+        """Pulls the device list from Wyze and publishes a new snapshot if anything changed. Returns success."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            ok = self._refresh_cameras()
+            return ok
+        finally:
+            REFRESH_SECONDS.labels("ok" if ok else "error").observe(time.perf_counter() - started)
+
+    def _refresh_cameras(self) -> bool:
         if not self.client:
             self.login()
         
         if not self.client:
              logger.warning("Cannot refresh cameras, no client")
-             return
+             return False
 
         try:
             logger.info("Refreshing camera list...")
-            response = self.client._api_client().get_object_list()
+            token = self.client._token
+            try:
+                with self.breakers["wyze_devices"].guard():
+                    response = self.client._api_client().get_object_list()
+            except WyzeApiError as e:
+                if not is_token_error(e.response):
+                    raise
+                self.handle_expired_token(token)
+                if not self.client:
+                    return False
+                with self.breakers["wyze_devices"].guard():
+                    response = self.client._api_client().get_object_list()
             
             if not response or not response.data:
                 logger.error("Failed to get response from Wyze API")
-                return
+                return False
 
             # Wyze API returns nested structure: {'code': '1', 'data': {'device_list': [...]}}
             data_dict = response.data.get("data")
             
             if not data_dict or "device_list" not in data_dict:
                 logger.error(f"Failed to get device_list from Wyze API response. Keys: {response.data.keys() if response.data else 'None'}")
-                return
+                return False
 
             devices = data_dict["device_list"]
             logger.info(f"Received {len(devices)} devices from Wyze API")
+            WYZE_DEVICES.set(len(devices))
 
-            new_cameras = {}
+            previous = self._cloud_cameras
+            cloud_cameras = {}
             for device in devices:
                 mac = device.get("mac")
                 nickname = device.get("nickname")
@@ -163,141 +598,729 @@ class WyzeManager:
                 safe_nickname = (nickname or mac).lower().replace(' ', '_')
                 stream_name = f"live/{safe_nickname}"
                 
-                # IP Logic: Manual Override > Cloud IP > None
+                # IP Logic: Manual Override > Cloud IP > None (manual IPs are applied in _apply_overrides)
                 cloud_ip = device.get("ip")
-                final_ip = self.manual_ips.get(mac, cloud_ip)
 
-                new_cameras[mac] = CameraInfo(
+                # Unchanged cameras keep their existing object
+                existing = previous.get(mac)
+                if existing is not None and existing.streamName == stream_name and existing.lanIp == cloud_ip:
+                    cloud_cameras[mac] = existing
+                    continue
+
+                cloud_cameras[mac] = CameraInfo(
                     cameraId=mac,
                     streamName=stream_name,
-                    lanIp=final_ip
+                    lanIp=cloud_ip
                 )
                 
-                logger.info(f"Found camera: {mac} ({nickname}) -> {stream_name} [IP: {final_ip} {'(Manual)' if mac in self.manual_ips else '(Cloud)'}]")
-
-            self.cameras = new_cameras
-            logger.info(f"Refreshed. Total cameras: {len(self.cameras)}")
-
+                logger.info(f"Found camera: {mac} ({nickname}) -> {stream_name} [IP: {self.manual_ips.get(mac, cloud_ip)} {'(Manual)' if mac in self.manual_ips else '(Cloud)'}]")
+
+            with self._inventory_lock:
+                self._cloud_cameras = cloud_cameras
+                self.inventory_source = "cloud"
+            changes = self._update_cameras(self._apply_overrides)
+            logger.info(f"Refreshed. Total cameras: {len(self.cameras)} "
+                        f"(+{len(changes['added'])} -{len(changes['removed'])} ~{len(changes['changed'])})")
+            return True
+
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Skipping camera refresh: {e}")
+            return False
         except Exception as e:
             logger.error(f"Failed to refresh cameras: {e}")
             logger.exception("Traceback:")
+            return False
+
+    def _get_wpk(self) -> WpkNetServiceClient:
+        """Returns the cached Mars signing client, rebuilding it if the access token rotated."""
+        token = self.client._token
+        if self._wpk is None or self._wpk.token != (token.strip() if token else None):
+            self._wpk = WpkNetServiceClient(token=token, base_url=MARS_URL)
+        return self._wpk
+
+    def _build_mars_request(self, device_id: str):
+        """Builds the signed regist_gw_user request exactly as WpkNetServiceClient.api_call would."""
+        wpk = self._get_wpk()
+        nonce = wpk.request_verifier.clock.nonce()
+        # A fresh id per token, as when every call built its own client; Mars may
+        # supersede tokens minted under the same unique_id
+        unique_id = str(uuid.uuid4())
+        body = json.dumps({
+            "ttl_minutes": 10080,
+            "nonce": str(nonce),
+            "unique_id": unique_id
+        }, separators=(',', ':'))
+        headers = wpk._get_headers(
+            request_specific_headers={
+                "appid": wpk.app_id,
+                "signature2": wpk.request_verifier.generate_dynamic_signature(timestamp=nonce, body=body),
+            },
+            nonce=nonce
+        )
+        headers.update(wpk.headers)
+        headers["phoneid"] = unique_id
+        headers["Content-Type"] = "application/json"
+        url = wpk._get_url(MARS_URL, MARS_REGISTER_GW_USER_ROUTE + device_id)
+        return url, headers, body
+
+    def _parse_mars_response(self, device_id: str, data_dict: Any) -> Optional[AccessCredential]:
+        if data_dict and isinstance(data_dict, dict):
+            data = data_dict.get("data", data_dict)
+            if isinstance(data, dict) and "accessId" in data and "accessToken" in data:
+                return AccessCredential(
+                    accessId=data["accessId"],
+                    accessToken=data["accessToken"]
+                )
 
-    def _fetch_token_from_mars(self, device_id: str) -> Optional[AccessCredential]:
-        """Makes the actual external API call to Wyze Mars. This is slow (2-4s)."""
+        logger.error(f"Failed to get token response for {device_id}: {data_dict}")
+        return None
+
+    def _get_mars_http(self) -> httpx.AsyncClient:
+        """Lazily creates the shared keep-alive pool to the Mars host (must run on the event loop)."""
+        if self._mars_http is None or self._mars_http.is_closed:
+            self._mars_http = httpx.AsyncClient(
+                timeout=httpx.Timeout(MARS_READ_TIMEOUT, connect=MARS_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=MARS_MAX_CONNECTIONS,
+                    max_keepalive_connections=MARS_MAX_CONNECTIONS,
+                    keepalive_expiry=MARS_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._mars_http
+
+    async def _fetch_token_from_mars_async(self, device_id: str) -> Optional[AccessCredential]:
+        """Makes the actual external API call to Wyze Mars over the pooled connection. This is slow (2-4s)."""
         if not self.client:
-            self.login()
+            if self.is_leader:
+                await asyncio.to_thread(self.login)
+            else:
+                # Only the leader logs in; a password login here would replace its session
+                await asyncio.to_thread(self.adopt_session)
+                if not self.client:
+                    raise SessionUnavailable("No Wyze session yet; the leader worker is still logging in")
 
         if not self.client:
             return None
 
+        started = time.perf_counter()
+        outcome = None  # "ok" or an error code label
         try:
-            wpk = WpkNetServiceClient(token=self.client._token, base_url=MARS_URL)
-            path = MARS_REGISTER_GW_USER_ROUTE + device_id
-
-            logger.info("Calling wpk.api_call...")
-            resp = wpk.api_call(
-                api_method=path,
-                json={
-                    "ttl_minutes": 10080,
-                    "nonce": wpk.request_verifier.clock.nonce(),
-                    "unique_id": wpk.phone_id
-                },
-                headers={
-                    "appid": wpk.app_id
-                },
-                nonce=wpk.request_verifier.clock.nonce()
-            )
-            
-            data_dict = getattr(resp, "data", None)
-            if not data_dict and hasattr(resp, "_data"):
-                data_dict = resp._data
-            
-            if data_dict and isinstance(data_dict, dict):
-                 if "data" in data_dict:
-                    data = data_dict["data"]
-
-                 return AccessCredential(
-                    accessId=data["accessId"],
-                    accessToken=data["accessToken"]
-                 )
-
-            logger.error(f"Failed to get token response for {device_id}: {resp}")
-            return None
-
+            token = self.client._token
+            url, headers, body = self._build_mars_request(device_id)
+            with self.breakers["mars"].guard():
+                timeout = httpx.Timeout(budget(MARS_READ_TIMEOUT), connect=budget(MARS_CONNECT_TIMEOUT))
+                resp = await self._get_mars_http().post(url, content=body.encode('utf-8'), headers=headers, timeout=timeout)
+                if resp.is_error:
+                    outcome = f"http_{resp.status_code}"
+                resp.raise_for_status()
+            payload = resp.json()
+            if is_token_error(payload):
+                outcome = "2001"
+                # Rotate the token; the scheduler's retry picks up the new one
+                await asyncio.to_thread(self.handle_expired_token, token)
+                return None
+            cred = self._parse_mars_response(device_id, payload)
+            outcome = "ok" if cred else str(payload.get("code", "no_token") if isinstance(payload, dict) else "no_token")
+            return cred
+
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        except DeadlineExceeded:
+            outcome = "deadline"
+            raise
         except Exception as e:
+            outcome = outcome or ("timeout" if isinstance(e, httpx.TimeoutException) else "exception")
             logger.exception(f"Error fetching Mars token for {device_id}: {e}")
             return None
+        finally:
+            camera = camera_label(device_id)
+            MARS_TOKEN_SECONDS.labels(camera).observe(time.perf_counter() - started)
+            if outcome != "ok":
+                MARS_TOKEN_ERRORS.labels(camera, outcome).inc()
+
+    async def close(self):
+        await self.token_reservoir.stop()
+        await self.token_scheduler.stop()
+        if self._mars_http is not None:
+            await self._mars_http.aclose()
+            self._mars_http = None
+
+    async def get_fresh_camera_token_async(self, device_id: str) -> Optional[AccessCredential]:
+        token = await self.token_reservoir.take(device_id)
+        if token:
+            return token
+        # Fail fast while Mars is down instead of queueing behind calls that will be rejected anyway
+        self.breakers["mars"].check()
+        return await self.token_scheduler.fetch(device_id)
 
+    def set_manual_ip(self, device_id: str, ip: str):
+        """Pins a camera's LAN IP. An empty ip removes the override and falls back to the cloud IP."""
+        def mutate():
+            if ip:
+                self.manual_ips[device_id] = ip
+            else:
+                self.manual_ips.pop(device_id, None)
+        self._mutate_overrides(mutate)
+        logger.info(f"Set manual IP for {device_id} to {ip or '(cloud)'}")
+
+    def add_or_update_camera(self, camera: CameraInfo):
+        def mutate():
+            self.added_cameras[camera.cameraId] = camera
+            self.deleted_cameras.discard(camera.cameraId)
+        self._mutate_overrides(mutate)
+
+    def delete_camera(self, device_id: str):
+        def mutate():
+            self.added_cameras.pop(device_id, None)
+            self.deleted_cameras.add(device_id)
+        self._mutate_overrides(mutate)
+
+    def export_overrides(self) -> Overrides:
+        with self._overrides_lock:
+            return self._export_overrides()
+
+    def _export_overrides(self) -> Overrides:
+        return Overrides(
+            manualIps=dict(self.manual_ips),
+            cameras=list(self.added_cameras.values()),
+            deleted=sorted(self.deleted_cameras)
+        )
+
+    def _load_overrides(self, overrides: Overrides):
+        self.manual_ips = dict(overrides.manualIps)
+        self.added_cameras = {c.cameraId: c for c in overrides.cameras}
+        self.deleted_cameras = set(overrides.deleted)
+
+    def import_overrides(self, overrides: Overrides, replace: bool = False) -> Dict[str, List[str]]:
+        """Applies many overrides at once: one inventory publish and one durable write."""
+        def mutate():
+            if replace:
+                self.manual_ips.clear()
+                self.added_cameras.clear()
+                self.deleted_cameras.clear()
+            self.manual_ips.update({cid: ip for cid, ip in overrides.manualIps.items() if ip})
+            for cid, ip in overrides.manualIps.items():
+                if not ip:
+                    self.manual_ips.pop(cid, None)
+            for camera in overrides.cameras:
+                self.added_cameras[camera.cameraId] = camera
+                self.deleted_cameras.discard(camera.cameraId)
+            for cid in overrides.deleted:
+                self.added_cameras.pop(cid, None)
+                self.deleted_cameras.add(cid)
+        return self._mutate_overrides(mutate, flush=True)
+
+    def _mutate_overrides(self, mutate: Callable[[], None], flush: bool = False) -> Dict[str, List[str]]:
+        """Runs an overrides edit under the lock and rebuilds the inventory. With a shared backend
+        the edit is a read-modify-write of the shared document, so concurrent edits in other
+        workers are never lost."""
+        if self.state.shared:
+            def apply(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+                with self._overrides_lock:
+                    if doc is not None:
+                        self._load_overrides(Overrides(**doc))
+                    mutate()
+                    return jsonable_encoder(self._export_overrides())
+            self._overrides_version, _ = self.state.update("overrides", apply)
+        else:
+            with self._overrides_lock:
+                mutate()
+        if self.is_leader:
+            if flush:
+                self._overrides_writer.flush()
+            else:
+                self._overrides_writer.mark_dirty()
+        return self._update_cameras(self._apply_overrides)
+
+    def sync_overrides(self) -> bool:
+        """Picks up overrides edited by other workers. Returns True if anything was reloaded."""
+        if self.state.version("overrides") == self._overrides_version:
+            return False
+        shared = self.state.read("overrides")
+        if shared is None:
+            return False
+        with self._overrides_lock:
+            self._overrides_version, doc = shared
+            self._load_overrides(Overrides(**doc))
+        if self.is_leader:
+            self._overrides_writer.mark_dirty()
+        self._update_cameras(self._apply_overrides)
+        return True
+
+    def seed_shared_overrides(self):
+        """First worker to lead against an empty shared store publishes its local overrides file."""
+        def apply(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            return doc if doc is not None else jsonable_encoder(self.export_overrides())
+        self.state.update("overrides", apply)
+        self.sync_overrides()
+
+    def flush_overrides(self):
+        if self.is_leader:
+            self._overrides_writer.flush()
+
+    def _apply_overrides(self, current: Mapping[str, CameraInfo]) -> Dict[str, CameraInfo]:
+        """Builds the served inventory: cloud cameras (or the boot snapshot before the first
+        refresh), plus added/updated cameras, minus deleted ones, with manual IPs applied."""
+        base = self.base_inventory() if self.is_leader else current
+        with self._overrides_lock:
+            result = dict(base)
+            result.update(self.added_cameras)
+            for cid in self.deleted_cameras:
+                result.pop(cid, None)
+            for cid, ip in self.manual_ips.items():
+                cam = result.get(cid)
+                if cam is not None and cam.lanIp != ip:
+                    result[cid] = CameraInfo(cameraId=cid, streamName=cam.streamName, lanIp=ip)
+            return result
+
+    def base_inventory(self) -> Mapping[str, CameraInfo]:
+        """The inventory overrides are applied to: the cloud list, or the boot snapshot's before the first refresh."""
+        return self._cloud_cameras if self.inventory_source == "cloud" else self._snapshot_cameras
+
+    def _update_cameras(self, build: Callable[[Mapping[str, CameraInfo]], Dict[str, CameraInfo]]) -> Dict[str, List[str]]:
+        """Builds the next inventory from the current one under the lock and, if anything
+        changed, publishes it as a new snapshot. Cameras equal to the current ones keep
+        their existing object."""
+        with self._inventory_lock:
+            version, current = self._snapshot
+            new_cameras = {
+                cid: current[cid] if current.get(cid) == cam else cam
+                for cid, cam in build(current).items()
+            }
+            changes = diff_cameras(current, new_cameras)
+            if not any(changes.values()):
+                return changes
+            snapshot = (version + 1, MappingProxyType(new_cameras))
+            self._snapshot = snapshot
+        self._notify_inventory(snapshot, changes)
+        return changes
+
+    def restore_inventory_snapshot(self) -> bool:
+        """Serves the last persisted inventory until the live refresh reconciles it."""
+        cameras = load_inventory_snapshot()
+        if cameras is None:
+            return False
+        with self._inventory_lock:
+            if self.inventory_source != "empty":
+                return False
+            self._snapshot_cameras = cameras
+            self.inventory_source = "snapshot"
+            self._snapshot = (self.inventory_version + 1, MappingProxyType(self._apply_overrides(cameras)))
+        logger.info(f"Loaded {len(cameras)} cameras from {INVENTORY_SNAPSHOT_FILE}; live refresh pending")
+        return True
+
+    def adopt_inventory(self, doc: Dict[str, Any]) -> bool:
+        """Follower workers serve the inventory the leader published, version included."""
+        # Readiness follows the leader's, even when the inventory itself is one we already serve
+        if doc.get("ready", True):
+            self._ready = True
+        cameras = {c["cameraId"]: CameraInfo(**c) for c in doc["cameras"]}
+        with self._inventory_lock:
+            version, current = self._snapshot
+            if (doc["version"] == version and doc.get("source") == self.inventory_source
+                    and doc.get("bootId", self.boot_id) == self.boot_id):
+                return False
+            new_cameras = {cid: current[cid] if current.get(cid) == cam else cam for cid, cam in cameras.items()}
+            changes = diff_cameras(current, new_cameras)
+            snapshot = (doc["version"], MappingProxyType(new_cameras))
+            self._snapshot = snapshot
+            self.inventory_source = doc.get("source", "snapshot")
+            self.boot_id = doc.get("bootId", self.boot_id)
+        self._notify_inventory(snapshot, changes)
+        return True
+
+    def add_inventory_listener(self, listener: Callable[[int, Mapping[str, CameraInfo], Dict[str, List[str]]], None]):
+        """Registers a callback for inventory changes: (version, cameras, {"added", "removed", "changed"})."""
+        self._inventory_listeners.append(listener)
+
+    def _notify_inventory(self, snapshot: Tuple[int, Mapping[str, CameraInfo]], changes: Dict[str, List[str]]):
+        version, cameras = snapshot
+        for listener in self._inventory_listeners:
+            try:
+                listener(version, cameras, changes)
+            except Exception as e:
+                logger.exception(f"Inventory listener failed: {e}")
+
+    def lan_paths(self, device_id: str) -> List[Tuple[str, str]]:
+        """Every known LAN IP for a camera as (source, ip): manual override, API-added, cloud."""
+        paths = []
+        manual_ip = self.manual_ips.get(device_id)
+        if manual_ip:
+            paths.append(("manual", manual_ip))
+        for source, cameras in (("added", self.added_cameras), ("cloud", self._cloud_cameras)):
+            camera = cameras.get(device_id)
+            if camera is not None and camera.lanIp and all(camera.lanIp != ip for _, ip in paths):
+                paths.append((source, camera.lanIp))
+        served = self.cameras.get(device_id)
+        if served is not None and served.lanIp and all(served.lanIp != ip for _, ip in paths):
+            paths.append(("snapshot", served.lanIp))
+        return paths
+
+    def all_lan_paths(self) -> Dict[str, List[Tuple[str, str]]]:
+        return {cid: self.lan_paths(cid) for cid in self.cameras}
+
+    def get_inventory(self) -> Tuple[int, List[CameraInfo]]:
+        version, cameras = self._snapshot
+        return version, list(cameras.values())
+
+
+state_backend = create_backend(STATE_BACKEND, STATE_DB_PATH)
+leader_lock = LeaderLock(LEADER_LOCK_FILE)
+manager = WyzeManager(state_backend)
+events = EventBroker()
+# Bursts of inventory changes (bulk imports, dashboard edits) collapse into one snapshot write
+inventory_snapshot_writer = CoalescingWriter(
+    INVENTORY_SNAPSHOT_FILE, lambda: inventory_snapshot_document(manager.cameras, manager.base_inventory()), delay=OVERRIDES_FLUSH_DELAY
+)
+manager.add_inventory_listener(
+    lambda version, cameras, changes: inventory_snapshot_writer.mark_dirty() if manager.is_leader else None
+)
 
-    def get_fresh_camera_token(self, device_id: str) -> Optional[AccessCredential]:
-         return self._fetch_token_from_mars(device_id)
+metrics.gauge("cryze_cameras", "Cameras in the served inventory", callback=lambda: len(manager.cameras))
+metrics.gauge("cryze_inventory_version", "Inventory version", callback=lambda: manager.inventory_version)
+metrics.gauge("cryze_token_queue_depth", "Token requests waiting for a Mars slot",
+              callback=lambda: manager.token_scheduler.queue_depth)
+metrics.gauge("cryze_token_in_flight", "Mars token calls in flight", callback=lambda: manager.token_scheduler.in_flight)
+lan_prober = LanProber(
+    manager.all_lan_paths, port=LAN_PROBE_PORT, timeout=LAN_PROBE_TIMEOUT,
+    concurrency=LAN_PROBE_CONCURRENCY, interval=LAN_PROBE_INTERVAL, ttl=LAN_PROBE_TTL
+)
+manager.add_inventory_listener(lambda version, cameras, changes: lan_prober.trigger())
+metrics.gauge("cryze_lan_paths_reachable", "Probed camera LAN IPs that answered",
+              callback=lambda: lan_prober.stats()["reachable"])
+metrics.gauge("cryze_lan_paths_unreachable", "Probed camera LAN IPs that did not answer",
+              callback=lambda: lan_prober.stats()["unreachable"])
+metrics.gauge("cryze_sse_subscribers", "Connected /events clients", callback=lambda: events.subscriber_count)
+manager.add_inventory_listener(
+    lambda version, cameras, changes: events.publish(
+        "inventory", {"version": version, "cameras": jsonable_encoder(list(cameras.values())), "changes": changes}
+    )
+)
+
+# Serialized (and compressed) read responses, rebuilt only when their source changes
+response_cache = VersionedCache()
+
+def leader_init():
+    """Login and discovery; runs in exactly one worker."""
+    try:
+        manager.login()
+        manager.refresh_scheduler.run_once()
+        manager._ready = True
+        logger.info(f"API fully ready — {len(manager.cameras)} cameras discovered")
+    except Exception as e:
+        logger.exception(f"Startup init failed: {e}")
+        manager._ready = True
+    manager.refresh_scheduler.start()
 
-    def set_manual_ip(self, device_id: str, ip: str):
-        self.manual_ips[device_id] = ip
-        save_manual_ips(self.manual_ips)
-        # Update in-memory camera immediately if present
-        if device_id in self.cameras:
-             # Create a copy to update
-             cam = self.cameras[device_id]
-             # Pydantic models are immutable-ish by default but we can replace
-             new_cam = CameraInfo(cameraId=cam.cameraId, streamName=cam.streamName, lanIp=ip)
-             self.cameras[device_id] = new_cam
-        logger.info(f"Set manual IP for {device_id} to {ip}")
 
 
-manager = WyzeManager()
+
+def promote_to_leader():
+    logger.warning(f"Worker {state_backend.worker_id} elected leader")
+    with manager._inventory_lock:
+        # Adopted inventory isn't backed by this worker's (empty) cloud list until its first refresh;
+        # the leader's base isn't shared, so the adopted inventory stands in for it
+        if manager.inventory_source != "empty":
+            manager._snapshot_cameras = dict(manager.cameras)
+            manager.inventory_source = "snapshot"
+        manager.is_leader = True
+    # Carry on with the previous leader's session instead of logging in again
+    manager.adopt_session()
+    manager.seed_shared_overrides()
+    threading.Thread(target=leader_init, daemon=True).start()
+
 
 @app.on_event("startup")
 def startup_event():
-    import threading
-    def _init():
-        try:
-            manager.login()
-            manager.refresh_cameras()
-            manager._ready = True
-            logger.info(f"API fully ready — {len(manager.cameras)} cameras discovered")
-        except Exception as e:
-            logger.exception(f"Startup init failed: {e}")
-            manager._ready = True
-    threading.Thread(target=_init, daemon=True).start()
+    state_backend.start()
+    manager.is_leader = leader_lock.try_acquire()
+    if not manager.is_leader and not state_backend.shared:
+        logger.warning("Another worker holds the leader lock but STATE_BACKEND=local, so every worker keeps "
+                       "its own cameras and messages. Set STATE_BACKEND=sqlite to run several workers.")
+        manager.is_leader = True
+
+    # Synchronous and local-only: with a snapshot on disk the API is usable before Wyze answers
+    if manager.restore_inventory_snapshot():
+        manager._ready = True
+
+    if manager.is_leader:
+        if state_backend.shared:
+            manager.seed_shared_overrides()
+        threading.Thread(target=leader_init, daemon=True).start()
+    else:
+        logger.info(f"Worker {state_backend.worker_id} following the leader for login and discovery")
+        manager.sync_overrides()
+        manager.adopt_session()
+    if state_backend.shared:
+        state_sync.start()
+
+
+background_tasks: List[asyncio.Task] = []
+
+async def monitor_event_loop():
+    """Samples event loop lag: how much later than requested a short sleep wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(EVENT_LOOP_PROBE_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - EVENT_LOOP_PROBE_INTERVAL))
+
+
+@app.on_event("startup")
+async def start_background_services():
+    events.bind(asyncio.get_running_loop())
+    background_tasks.append(asyncio.create_task(monitor_event_loop()))
+    if event_log:
+        event_log.start()
+        await asyncio.to_thread(restore_camera_messages)
+    # Every worker takes tokens; only the leader (including one promoted later) mints them
+    manager.token_reservoir.start(
+        lambda: list(manager.cameras),
+        lambda: manager.is_leader and manager._ready and manager.client is not None
+    )
+    if lan_prober.start():
+        background_tasks.append(lan_prober._task)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    manager.refresh_scheduler.stop()
+    state_sync.stop()
+    for task in background_tasks:
+        task.cancel()
+    await manager.close()
+    if manager.is_leader:
+        manager.flush_overrides()
+        inventory_snapshot_writer.flush()
+    if event_log:
+        await asyncio.to_thread(event_log.stop)
+    await asyncio.to_thread(state_backend.stop)
+    leader_lock.release()
+    log_pipeline.stop()
+
+
+app.add_middleware(DeadlineMiddleware, default=REQUEST_DEADLINE, maximum=REQUEST_DEADLINE_MAX)
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Upstream known to be down: fail in microseconds and tell the client when to come back."""
+    retry_after = max(1, math.ceil(exc.retry_after))
+    return JSONResponse(status_code=503, headers={"Retry-After": str(retry_after)},
+                        content={"detail": str(exc), "upstream": exc.name, "retryAfter": retry_after})
+
+@app.exception_handler(SessionUnavailable)
+async def session_unavailable_handler(request: Request, exc: SessionUnavailable):
+    retry_after = max(1, math.ceil(STATE_SYNC_INTERVAL * 4))
+    return JSONResponse(status_code=503, headers={"Retry-After": str(retry_after)},
+                        content={"detail": str(exc), "retryAfter": retry_after})
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc) or "Request deadline exceeded"})
 
 
 @app.get("/health")
 def health():
     if not manager._ready:
         raise HTTPException(status_code=503, detail="API starting up, cameras not yet discovered")
-    return {"status": "ok", "cameras": len(manager.cameras)}
+    return {
+        "status": "ok",
+        "cameras": len(manager.cameras),
+        "inventorySource": manager.inventory_source,
+        "stale": manager.inventory_source != "cloud",
+        "refresh": manager.refresh_scheduler.snapshot(),
+        "circuits": {name: breaker.snapshot() for name, breaker in manager.breakers.items()},
+        "worker": {
+            "pid": os.getpid(),
+            "leader": manager.is_leader,
+            "state": state_backend.stats(),
+            "sync": state_sync.snapshot() if state_backend.shared else None
+        }
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+class LogLevelRequest(BaseModel):
+    level: str
+    logger: Optional[str] = None
+
+@app.get("/logging")
+def get_logging():
+    return log_pipeline.status()
+
+@app.post("/logging")
+def set_log_level(req: LogLevelRequest):
+    """Changes a log level at runtime, e.g. {"level": "INFO"} or {"level": "DEBUG", "logger": "wyze_sdk"}."""
+    try:
+        log_pipeline.set_level(req.level, req.logger)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown log level {req.level}")
+    return log_pipeline.status()
 
 
 @app.get("/Camera/CameraList")
-def get_camera_list():
-    return list(manager.cameras.keys())
+def get_camera_list(request: Request):
+    version = manager.inventory_version
+    cached = response_cache.get("camera_list", (manager.boot_id, version), lambda: json_body(
+        list(manager.cameras.keys()), etag=f'"{manager.boot_id}-{version}"'
+    ))
+    return cached.response(request)
+
+def device_info(camera: CameraInfo) -> DeviceInfo:
+    paths = manager.lan_paths(camera.cameraId)
+    ranked = lan_prober.rank(paths)
+    sources = dict(paths)
+    preferred = next((p["ip"] for p in ranked if p["reachable"]), camera.lanIp)
+    return DeviceInfo(
+        cameraId=camera.cameraId,
+        streamName=camera.streamName,
+        lanIp=camera.lanIp,
+        preferredIp=preferred,
+        ipMismatch="manual" in sources and "cloud" in sources and sources["manual"] != sources["cloud"],
+        lanPaths=ranked
+    )
 
 @app.get("/Camera/DeviceInfo")
-def get_device_info(deviceId: str):
-    if deviceId in manager.cameras:
-        return manager.cameras[deviceId]
+def get_device_info(deviceId: str, request: Request):
+    camera = manager.cameras.get(deviceId)
+    if camera is not None:
+        # Probe results change independently of the inventory, so this one is content-hashed per request
+        return json_body(device_info(camera)).response(request)
     raise HTTPException(status_code=404, detail="Camera not found")
 
+@app.get("/Camera/LanStatus")
+def get_lan_status():
+    """Ranked LAN paths for every camera plus prober stats."""
+    return {
+        "prober": lan_prober.stats(),
+        "cameras": [device_info(camera) for camera in manager.cameras.values()]
+    }
+
+@app.get("/Camera/Inventory")
+def get_camera_inventory(request: Request):
+    """Every CameraInfo in one response. Send the ETag back as If-None-Match to get a 304 when nothing changed."""
+    etag = f'"{manager.boot_id}-{manager.inventory_version}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+    version, cameras = manager.get_inventory()
+    cached = response_cache.get("inventory", (manager.boot_id, version), lambda: json_body(
+        {"version": version, "cameras": cameras}, etag=f'"{manager.boot_id}-{version}"'
+    ))
+    return cached.response(request)
+
 @app.get("/Camera/CameraToken")
-def get_camera_token_endpoint(deviceId: str):
-    token = manager.get_fresh_camera_token(deviceId)
+async def get_camera_token_endpoint(deviceId: str):
+    token = await manager.get_fresh_camera_token_async(deviceId)
     if token:
         return token
     raise HTTPException(status_code=500, detail=f"Failed to fetch token for {deviceId}")
 
+@app.get("/Camera/TokenStats")
+def get_token_stats():
+    return {
+        "scheduler": manager.token_scheduler.snapshot(),
+        "reservoir": manager.token_reservoir.snapshot(),
+        "circuit": manager.breakers["mars"].snapshot(),
+    }
+
+p2p_server_directory = ServerDirectory(P2P_SAVE_DIR)
+
+@app.get("/P2P/Servers")
+def get_p2p_servers():
+    """GWELL P2P servers decoded from saved captures, in the order they should be tried."""
+    ranked = p2p_server_directory.ranked()
+    return {
+        "source": P2P_SAVE_DIR,
+        "servers": [
+            {
+                "ip": r.server.ip,
+                "port": r.server.port,
+                "serverId": r.server.server_id,
+                "level": r.server.level,
+                "ipv6": r.server.ipv6,
+                "sightings": r.sightings,
+                "lastSeen": r.last_seen,
+            }
+            for r in ranked
+        ]
+    }
+
 @app.post("/Camera/SetManualIP")
 def set_manual_ip(req: ManualIPRequest):
     manager.set_manual_ip(req.cameraId, req.ip)
     return {"status": "updated", "cameraId": req.cameraId, "ip": req.ip}
 
 @app.post("/Camera/GetAllSupportedCameras")
-def trigger_refresh_cameras(background_tasks: BackgroundTasks):
-    background_tasks.add_task(manager.refresh_cameras)
+def trigger_refresh_cameras():
+    if manager.is_leader:
+        manager.refresh_scheduler.trigger()
+    else:
+        state_backend.bump("refresh_requests")
     return {"status": "refresh_queued"}
 
 # Event Storage
-camera_messages = {}
+camera_messages = MessageStore(history_size=MESSAGE_HISTORY_SIZE, max_bytes=MESSAGE_STORE_MAX_BYTES)
+metrics.gauge("cryze_camera_message_keys", "Keys held in the camera message store",
+              callback=lambda: camera_messages.stats()["keys"])
+metrics.gauge("cryze_camera_message_bytes", "Approximate size of the camera message store",
+              callback=lambda: camera_messages.stats()["approxBytes"])
+event_log = EventLog(EVENT_LOG_PATH, retention_days=EVENT_LOG_RETENTION_DAYS) if EVENT_LOG_ENABLED else None
+
+state_sync = StateSync(
+    state_backend, manager, leader_lock, camera_messages, events,
+    session_file=WYZE_SESSION_FILE, on_promote=promote_to_leader, interval=STATE_SYNC_INTERVAL
+)
+
+def restore_camera_messages():
+    """Re-seeds the in-memory store from the event log so /messages survives restarts."""
+    rows = event_log.latest_values(time.time() - EVENT_LOG_RESTORE_HOURS * 3600)
+    for ts, camera_id, _, key, value in rows:
+        camera_messages.update(camera_id, {key: value}, ts=ts)
+    logger.info(f"Restored {len(rows)} camera events from {EVENT_LOG_PATH}")
+
+def message_updates(message_type: str, path: Optional[str], data: Any) -> Dict[str, str]:
+    """Store keys/values for one camera message. WRITABLE objects are split into one key per field."""
+    updates: Dict[str, str] = {}
+    if message_type == "MSG_TYPE_PRO_CONST":
+        updates[camera_messages.key(message_type)] = data if isinstance(data, str) else json.dumps(data)
+        return updates
+    if message_type == "MSG_TYPE_PRO_WRITABLE":
+        payload = data
+        if isinstance(data, str):
+            try:
+                payload = _json_loads(data)
+            except json.JSONDecodeError:
+                payload = None
+        if isinstance(payload, dict):
+            for sub_key, sub_val in payload.items():
+                updates[camera_messages.key(message_type, str(path), sub_key)] = str(sub_val)
+        else:
+            updates[camera_messages.key(message_type, str(path))] = data if isinstance(data, str) else json.dumps(data)
+        return updates
+    updates[camera_messages.key(message_type, path or None)] = data if isinstance(data, str) else json.dumps(data)
+    return updates
+
+def ingest_camera_messages(batch: List[Tuple[str, str, Dict[str, str]]]):
+    """Applies parsed (cameraId, messageType, updates) messages to the store, shared state, event log and SSE."""
+    ts = time.time()
+    camera_messages.update_many(((camera_id, updates) for camera_id, _, updates in batch), ts)
+    per_camera: Dict[str, Dict[str, str]] = {}
+    for camera_id, message_type, updates in batch:
+        CAMERA_MESSAGES.labels(message_type_label(message_type)).inc()
+        if event_log:
+            event_log.append(camera_id, message_type, updates, ts)
+        per_camera.setdefault(camera_id, {}).update(updates)
+    for camera_id, updates in per_camera.items():
+        state_backend.append_messages(camera_id, updates, ts)
+        events.publish("camera_message", {"cameraId": camera_id, "updates": updates})
 
 @app.post("/CameraMessage")
 async def receive_camera_message(
@@ -312,43 +1335,134 @@ async def receive_camera_message(
     except UnicodeDecodeError:
         data = str(body_bytes)
 
-    logger.info(f"CameraMessage: {cameraId} [{messageType}] {path}")
+    logger.info(f"CameraMessage: {cameraId} [{messageType}] {path}",
+                extra={"cameraId": cameraId, "messageType": messageType, "path": path})
 
-    if cameraId not in camera_messages:
-        camera_messages[cameraId] = {}
-
-    if messageType == "MSG_TYPE_PRO_CONST":
-        camera_messages[cameraId][messageType] = data
-    elif messageType == "MSG_TYPE_PRO_READONLY":
-        key = f"{messageType}::{path}" if path else messageType
-        camera_messages[cameraId][key] = data
-    elif messageType == "MSG_TYPE_PRO_WRITABLE":
-        try:
-            payload = json.loads(data)
-            if isinstance(payload, dict):
-                for sub_key, sub_val in payload.items():
-                     key = f"{messageType}::{path}::{sub_key}"
-                     camera_messages[cameraId][key] = str(sub_val)
-            else:
-                 camera_messages[cameraId][f"{messageType}::{path}"] = data
-        except json.JSONDecodeError:
-            camera_messages[cameraId][f"{messageType}::{path}"] = data
-    else:
-        key = f"{messageType}::{path}" if path else messageType
-        camera_messages[cameraId][key] = data
-    
+    ingest_camera_messages([(cameraId, messageType, message_updates(messageType, path, data))])
     return {"status": "received"}
 
+@app.post("/CameraMessage/Batch")
+async def receive_camera_message_batch(request: Request):
+    """Many camera messages in one request: a JSON array or NDJSON (one object per line).
+
+    Each message is {"cameraId", "messageType", "path"?, "data"}, where data is the
+    body the single-message endpoint would receive (a string, or the decoded JSON).
+    Valid messages are applied in order under one store lock; invalid ones are
+    skipped and reported by index.
+    """
+    body = await request.body()
+    stripped = body.lstrip()
+    try:
+        if stripped.startswith(b"["):
+            items = _json_loads(body)
+        else:
+            items = [_json_loads(line) for line in body.splitlines() if line.strip()]
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+    if len(items) > MESSAGE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch holds {len(items)} messages, limit is {MESSAGE_BATCH_MAX}")
+
+    batch: List[Tuple[str, str, Dict[str, str]]] = []
+    rejected: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        camera_id = item.get("cameraId") if isinstance(item, dict) else None
+        message_type = item.get("messageType") if isinstance(item, dict) else None
+        if not isinstance(camera_id, str) or not isinstance(message_type, str) or "data" not in item:
+            rejected.append({"index": index, "error": "cameraId, messageType and data are required"})
+            continue
+        path = item.get("path")
+        batch.append((camera_id, message_type, message_updates(message_type, None if path is None else str(path), item["data"])))
+
+    if batch:
+        cameras = sorted({camera_id for camera_id, _, _ in batch})
+        logger.info(f"CameraMessage batch: {len(batch)} messages for {', '.join(cameras)}",
+                    extra={"cameraId": cameras[0] if len(cameras) == 1 else None, "messageType": "batch"})
+        ingest_camera_messages(batch)
+    return {"status": "received", "accepted": len(batch), "rejected": rejected}
+
 @app.get("/messages")
-def get_messages():
-    return camera_messages
+def get_messages(
+    request: Request,
+    since: Optional[str] = Query(None, description="Cursor from a previous call; empty for a full snapshot and a first cursor"),
+    cameraId: Optional[str] = None,
+    prefix: Optional[str] = Query(None, description="Only keys starting with this, e.g. MSG_TYPE_PRO_WRITABLE")
+):
+    """{cameraId: {key: latest value}}, or with `since` only what changed after that cursor:
+    {cursor, full, messages, removed}. Poll again with the returned cursor."""
+    if since is not None:
+        # With several workers the cursor must mean the same on each of them: answer from the shared table
+        source = state_backend if state_backend.shared else camera_messages
+        return json_body(source.changes_since(since, cameraId, prefix)).response(request)
+    if cameraId is not None or prefix is not None:
+        return json_body(camera_messages.changes_since(None, cameraId, prefix)["messages"]).response(request)
+
+    def build() -> CachedBody:
+        _, latest = camera_messages.latest_versioned()
+        return json_body(latest)
+
+    return response_cache.get("messages", camera_messages.version, build).response(request)
+
+@app.get("/messages/history")
+def get_message_history(cameraId: str, key: Optional[str] = None):
+    """Timestamped value history per key for one camera, optionally narrowed to a single key."""
+    return camera_messages.history(cameraId, key)
+
+@app.get("/messages/log")
+def get_message_log(
+    cameraId: Optional[str] = None,
+    start: Optional[float] = Query(None, description="Unix timestamp, inclusive"),
+    end: Optional[float] = Query(None, description="Unix timestamp, exclusive"),
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """Persisted camera events, newest first. Requires EVENT_LOG_ENABLED."""
+    if not event_log:
+        raise HTTPException(status_code=404, detail="Event log is disabled")
+    return event_log.query(camera_id=cameraId, start=start, end=end, limit=limit)
+
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/events")
+async def event_stream(request: Request):
+    """Server-Sent Events: a full `inventory` + `messages` snapshot on connect, then live changes."""
+    queue = events.subscribe()
+
+    async def stream():
+        try:
+            version, cameras = manager.get_inventory()
+            yield events.encode("inventory", {"version": version, "cameras": jsonable_encoder(cameras)})
+            yield events.encode("messages", camera_messages.latest())
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            events.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/", response_class=HTMLResponse)
-def dashboard():
-    
+def dashboard(request: Request):
     android_ip = os.getenv("CRYZE_ANDROID_IP") or os.getenv("CONTAINER_IP")
     rtsp_port_env = os.getenv("RTSP_PORT_EXTERNAL", "8554")
-    
+    boot_id, version = manager.boot_id, manager.inventory_version
+
+    def build() -> CachedBody:
+        body = render_dashboard(android_ip, rtsp_port_env).encode()
+        # Versions restart at 1 with each boot, so the ETag carries the boot id like the inventory's
+        etag = f'W/"{boot_id}-{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        return CachedBody(body, "text/html; charset=utf-8", etag=etag, precompress=True)
+
+    # The page only depends on the RTSP host/port and the camera list; it's built and
+    # compressed once per combination and served from memory otherwise
+    cached = response_cache.get("dashboard", (boot_id, version, android_ip, rtsp_port_env), build)
+    return cached.response(request)
+
+def render_dashboard(android_ip: Optional[str], rtsp_port_env: str) -> str:
     if android_ip:
         rtsp_host_js_logic = f"'{android_ip}'"
         rtsp_port_js_logic = "'8554'"
@@ -407,7 +1521,7 @@ def dashboard():
                     btn.disabled = true; btn.textContent = '⏳ Refreshing...';
                     fetch('/Camera/GetAllSupportedCameras', {{method: 'POST'}})
                         .then(r => r.json())
-                        .then(() => {{ btn.textContent = '✓ Queued'; setTimeout(() => location.reload(), 5000); }})
+                        .then(() => {{ btn.textContent = '✓ Queued'; setTimeout(() => {{ btn.disabled = false; btn.textContent = '🔄 Refresh Cameras'; }}, 5000); }})
                         .catch(() => {{ btn.disabled = false; btn.textContent = '❌ Failed'; }});
                 }}
 
@@ -418,85 +1532,108 @@ def dashboard():
                             method: 'POST',
                             headers: {{'Content-Type': 'application/json'}},
                             body: JSON.stringify({{cameraId: mac, ip: newIp}})
-                        }}).then(r => r.json()).then(() => location.reload());
+                        }}).then(r => r.json());
                     }}
                 }}
 
-                async function load() {{
-                    try {{
-                        const [camIds, msgs] = await Promise.all([
-                            fetch('/Camera/CameraList').then(r => r.json()),
-                            fetch('/messages').then(r => r.json())
-                        ]);
-                        
-                        const container = document.getElementById('cameras');
-                        
-                        if (camIds.length === 0) {{
-                            container.innerHTML = '<div class="camera-card">No cameras found. Check logs.</div>';
-                            return;
-                        }}
-
-                        const cams = await Promise.all(camIds.map(id =>
-                            fetch('/Camera/DeviceInfo?deviceId=' + encodeURIComponent(id)).then(r => r.json())
-                        ));
-
-                        container.innerHTML = cams.map(cam => {{
-                            const mac = cam.cameraId;
-                            const streamName = cam.streamName || ('live/' + mac);
-                            const camMsgs = msgs[mac] || {{}};
-                            const msgHtml = Object.entries(camMsgs).map(([k, v]) => 
-                                `<div class="event"><span class="event-key">${{k}}</span>: ${{v}}</div>`
-                            ).join('');
-                            
-                            const rtspUrl = `rtsp://${{RTSP_HOST}}:${{RTSP_PORT}}/${{streamName}}`;
-                            const tokenInfo = TOKEN_STATUS[mac];
-                            const tokenClass = tokenInfo && tokenInfo.startsWith('✓') ? 'token-ok' : '';
-                            
-                            return `
-                                <div class="camera-card">
-                                    <div class="camera-header">
-                                        <div style="display: flex; align-items: center;">
-                                            <div class="camera-id">${{mac}}</div>
-                                            <div class="ip-badge" onclick="setIp('${{mac}}', '${{cam.lanIp || ''}}')">
-                                                IP: ${{cam.lanIp || 'Unknown (Set Manual)'}} ✏️
-                                            </div>
-                                        </div>
-                                        <div>
-                                            <span class="status-badge">Connected</span>
-                                        </div>
-                                    </div>
-                                    <div style="margin-bottom: 15px; padding: 10px; background: #e2e3e5; border-radius: 4px;">
-                                        <strong>Stream URL:</strong> 
-                                        <code style="font-family: monospace; user-select: all;">${{rtspUrl}}</code>
-                                    </div>
-                                    <div class="events-section">
-                                        <h4>Device Events</h4>
-                                        ${{msgHtml || '<div>No events received yet</div>'}}
+                const state = {{ cameras: {{}}, messages: {{}} }};
+
+                function eventsHtml(mac) {{
+                    const camMsgs = state.messages[mac] || {{}};
+                    const msgHtml = Object.entries(camMsgs).map(([k, v]) => 
+                        `<div class="event"><span class="event-key">${{k}}</span>: ${{v}}</div>`
+                    ).join('');
+                    return msgHtml || '<div>No events received yet</div>';
+                }}
+
+                function cardHtml(cam) {{
+                    const mac = cam.cameraId;
+                    const streamName = cam.streamName || ('live/' + mac);
+                    const rtspUrl = `rtsp://${{RTSP_HOST}}:${{RTSP_PORT}}/${{streamName}}`;
+                    
+                    return `
+                        <div class="camera-card">
+                            <div class="camera-header">
+                                <div style="display: flex; align-items: center;">
+                                    <div class="camera-id">${{mac}}</div>
+                                    <div class="ip-badge" onclick="setIp('${{mac}}', '${{cam.lanIp || ''}}')">
+                                        IP: ${{cam.lanIp || 'Unknown (Set Manual)'}} ✏️
                                     </div>
                                 </div>
-                            `;
-                        }}).join('');
+                                <div>
+                                    <span class="status-badge">Connected</span>
+                                </div>
+                            </div>
+                            <div style="margin-bottom: 15px; padding: 10px; background: #e2e3e5; border-radius: 4px;">
+                                <strong>Stream URL:</strong> 
+                                <code style="font-family: monospace; user-select: all;">${{rtspUrl}}</code>
+                            </div>
+                            <div class="events-section">
+                                <h4>Device Events</h4>
+                                <div id="events-${{mac}}">${{eventsHtml(mac)}}</div>
+                            </div>
+                        </div>
+                    `;
+                }}
 
-                    }} catch (e) {{
-                        console.error(e);
+                function renderCameras() {{
+                    const container = document.getElementById('cameras');
+                    const cams = Object.values(state.cameras);
+                    if (cams.length === 0) {{
+                        container.innerHTML = '<div class="camera-card">No cameras found. Check logs.</div>';
+                        return;
                     }}
+                    container.innerHTML = cams.map(cardHtml).join('');
+                }}
+
+                function renderEvents(mac) {{
+                    const el = document.getElementById('events-' + mac);
+                    if (el) el.innerHTML = eventsHtml(mac);
                 }}
-                load();
-                setInterval(load, 3000);
+
+                // Server push: the server sends a snapshot on (re)connect, then only changes
+                function connect() {{
+                    const es = new EventSource('/events');
+                    es.addEventListener('inventory', e => {{
+                        const inv = JSON.parse(e.data);
+                        state.cameras = Object.fromEntries(inv.cameras.map(c => [c.cameraId, c]));
+                        renderCameras();
+                    }});
+                    es.addEventListener('messages', e => {{
+                        state.messages = JSON.parse(e.data);
+                        Object.keys(state.cameras).forEach(renderEvents);
+                    }});
+                    es.addEventListener('camera_message', e => {{
+                        const msg = JSON.parse(e.data);
+                        state.messages[msg.cameraId] = Object.assign(state.messages[msg.cameraId] || {{}}, msg.updates);
+                        renderEvents(msg.cameraId);
+                    }});
+                    es.addEventListener('resync', () => {{ es.close(); connect(); }});
+                }}
+                connect();
             </script>
         </body>
     </html>
     """
-    return HTMLResponse(content=html_content)
+    return html_content
 
 @app.post("/Camera/AddOrUpdate")
 def add_or_update_camera(camera: CameraInfo):
-    manager.cameras[camera.cameraId] = camera
+    manager.add_or_update_camera(camera)
     return {"status": "updated"}
 
 @app.post("/Camera/Delete")
 def delete_camera(camera: CameraInfo):
-    if camera.cameraId in manager.cameras:
-        del manager.cameras[camera.cameraId]
+    manager.delete_camera(camera.cameraId)
     return {"status": "deleted"}
 
+@app.get("/Camera/Overrides")
+def get_overrides():
+    return manager.export_overrides()
+
+@app.post("/Camera/Overrides")
+def import_overrides(overrides: Overrides, mode: str = Query("merge", pattern="^(merge|replace)$")):
+    """Bulk-applies manual IPs and added/deleted cameras: one inventory update and one file write."""
+    changes = manager.import_overrides(overrides, replace=mode == "replace")
+    return {"status": "updated", "mode": mode, "version": manager.inventory_version, "changes": changes}
+
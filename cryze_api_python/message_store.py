@@ -0,0 +1,213 @@
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+# Rough per-entry overhead (deque slot, tuple, float, key references) used for budgeting
+ENTRY_OVERHEAD_BYTES = 96
+# Upper bound on cached key strings; the cache is simply rebuilt if a camera sprays unique keys
+MAX_CACHED_KEYS = 65536
+# Evicted keys remembered for delta clients; a cursor older than the oldest one gets a full snapshot
+MAX_TOMBSTONES = 4096
+
+
+class _KeyState:
+    __slots__ = ("values", "updates", "last_seen", "size", "seq")
+
+    def __init__(self, history_size: int):
+        self.values: Deque[Tuple[float, str]] = deque(maxlen=history_size)
+        self.updates = 0
+        self.last_seen = 0.0
+        self.size = 0
+        self.seq = 0  # store seq of the latest value change
+
+
+class MessageStore:
+    """Bounded store for /CameraMessage updates.
+
+    Keys are built once per (messageType, path, sub_key) and interned, so hot
+    keys don't re-format strings on every update. Each (camera, key) keeps a
+    fixed-size ring of timestamped values, recording a new entry only when the
+    value changes. Once the approximate memory footprint passes `max_bytes`, the
+    least recently updated keys are evicted whole.
+
+    Every value change and eviction takes the next `seq`, so changes_since()
+    can answer "what changed after this cursor" by walking only the keys that
+    changed. Cursors are "<epoch>-<seq>"; the epoch is per store instance, so a
+    cursor from before a restart gets a full snapshot. (With several workers,
+    SqliteBackend.changes_since() answers cursors instead.)
+    """
+
+    def __init__(self, history_size: int = 16, max_bytes: int = 8 * 1024 * 1024):
+        self.history_size = max(1, history_size)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._keys: Dict[Tuple[str, Optional[str], Optional[str]], str] = {}
+        self._entries: "OrderedDict[Tuple[str, str], _KeyState]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        # Bumped whenever latest() would return something different
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        # Same keys as _entries, ordered by the seq of their latest change
+        self._changed: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._tombstones: Deque[Tuple[int, str, str]] = deque(maxlen=MAX_TOMBSTONES)
+        # Deltas from cursors before this seq may miss evictions
+        self._tombstone_floor = 0
+
+    def key(self, message_type: str, path: Optional[str] = None, sub_key: Optional[str] = None) -> str:
+        """Returns the interned `messageType[::path[::sub_key]]` key."""
+        parts = (message_type, path, sub_key)
+        key = self._keys.get(parts)
+        if key is None:
+            if len(self._keys) >= MAX_CACHED_KEYS:
+                self._keys.clear()
+            key = sys.intern("::".join(p for p in parts if p is not None))
+            self._keys[parts] = key
+        return key
+
+    def update(self, camera_id: str, updates: Dict[str, str], ts: Optional[float] = None):
+        self.update_many(((camera_id, updates),), ts)
+
+    def update_many(self, batch: Iterable[Tuple[str, Dict[str, str]]], ts: Optional[float] = None):
+        """Applies (camera_id, updates) pairs in order under one lock, with one eviction pass and version bump."""
+        ts = time.time() if ts is None else ts
+        batch = [(sys.intern(camera_id), updates) for camera_id, updates in batch]
+        with self._lock:
+            changed = False
+            for camera_id, updates in batch:
+                for key, value in updates.items():
+                    changed = self._apply(camera_id, key, value, ts) or changed
+            if self._evict() or changed:
+                self.version += 1
+
+    def _apply(self, camera_id: str, key: str, value: str, ts: float) -> bool:
+        entry_key = (camera_id, key)
+        state = self._entries.get(entry_key)
+        if state is None:
+            state = _KeyState(self.history_size)
+            self._entries[entry_key] = state
+        else:
+            self._entries.move_to_end(entry_key)
+        state.updates += 1
+        state.last_seen = ts
+        if state.values and state.values[-1][1] == value:
+            return False
+        if len(state.values) == state.values.maxlen:
+            dropped = len(state.values[0][1]) + ENTRY_OVERHEAD_BYTES
+            state.size -= dropped
+            self._bytes -= dropped
+        state.values.append((ts, value))
+        self.seq += 1
+        state.seq = self.seq
+        self._changed[entry_key] = None
+        self._changed.move_to_end(entry_key)
+        added = len(value) + ENTRY_OVERHEAD_BYTES
+        state.size += added
+        self._bytes += added
+        return True
+
+    def _evict(self) -> bool:
+        evicted = False
+        # Never evict the most recently written key
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            entry_key, state = self._entries.popitem(last=False)
+            self._changed.pop(entry_key, None)
+            self.seq += 1
+            if len(self._tombstones) == MAX_TOMBSTONES:
+                self._tombstone_floor = self._tombstones[0][0]
+            self._tombstones.append((self.seq, *entry_key))
+            self._bytes -= state.size
+            self.evictions += 1
+            evicted = True
+        return evicted
+
+    def latest(self) -> Dict[str, Dict[str, str]]:
+        """Same shape the API has always served: {cameraId: {key: latest value}}."""
+        return self.latest_versioned()[1]
+
+    def latest_versioned(self) -> Tuple[int, Dict[str, Dict[str, str]]]:
+        """latest() together with the version it reflects, read under one lock."""
+        result: Dict[str, Dict[str, str]] = {}
+        with self._lock:
+            for (camera_id, key), state in self._entries.items():
+                result.setdefault(camera_id, {})[key] = state.values[-1][1]
+            return self.version, result
+
+    def _parse_cursor(self, cursor: Optional[str]) -> Optional[int]:
+        """The seq a cursor from this store points at, or None when it calls for a full snapshot."""
+        if not cursor:
+            return None
+        epoch, _, seq = cursor.partition("-")
+        try:
+            since = int(seq)
+        except ValueError:
+            return None
+        if epoch != self.epoch or since > self.seq or since < self._tombstone_floor:
+            return None
+        return since
+
+    def changes_since(self, cursor: Optional[str], camera_id: Optional[str] = None,
+                      prefix: Optional[str] = None) -> Dict[str, Any]:
+        """Latest values of the keys changed after `cursor`, plus the cursor to poll with next.
+
+        `full` is True when the cursor is empty, unknown or too old, and `messages`
+        then holds every key (the client should replace its state). Otherwise
+        `removed` lists keys evicted since the cursor. Both can be narrowed to one
+        camera and/or keys starting with `prefix` (e.g. a messageType).
+        """
+        messages: Dict[str, Dict[str, str]] = {}
+        removed: Dict[str, List[str]] = {}
+        with self._lock:
+            since = self._parse_cursor(cursor)
+            next_cursor = f"{self.epoch}-{self.seq}"
+            if since is None:
+                for (cam, key), state in self._entries.items():
+                    if (camera_id is None or cam == camera_id) and (prefix is None or key.startswith(prefix)):
+                        messages.setdefault(cam, {})[key] = state.values[-1][1]
+                return {"cursor": next_cursor, "full": True, "messages": messages, "removed": removed}
+
+            changed = []
+            for entry_key in reversed(self._changed):
+                state = self._entries[entry_key]
+                if state.seq <= since:
+                    break
+                changed.append((entry_key, state.values[-1][1]))
+            for (cam, key), value in reversed(changed):
+                if (camera_id is None or cam == camera_id) and (prefix is None or key.startswith(prefix)):
+                    messages.setdefault(cam, {})[key] = value
+            for seq, cam, key in reversed(self._tombstones):
+                if seq <= since:
+                    break
+                if (cam, key) in self._entries:
+                    continue  # written again after the eviction; it's in messages
+                if (camera_id is None or cam == camera_id) and (prefix is None or key.startswith(prefix)):
+                    removed.setdefault(cam, []).append(key)
+        return {"cursor": next_cursor, "full": False, "messages": messages, "removed": removed}
+
+    def history(self, camera_id: str, key: Optional[str] = None) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        with self._lock:
+            for (cam, k), state in self._entries.items():
+                if cam != camera_id or (key is not None and k != key):
+                    continue
+                result[k] = {
+                    "updates": state.updates,
+                    "lastSeen": state.last_seen,
+                    "history": [{"ts": ts, "value": value} for ts, value in state.values],
+                }
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "keys": len(self._entries),
+                "approxBytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "historySize": self.history_size,
+                "evictions": self.evictions,
+                "seq": self.seq,
+            }
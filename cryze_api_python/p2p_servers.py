@@ -0,0 +1,200 @@
+"""Decoder for the GWELL/IoTVideo P2P server list cached in p2pSave/<type>.p2p.
+
+The SDK hands the blob to ivCommonSetCb, which the Android app writes to
+files/p2pSave/<type>.p2p and logs as a signed byte array. Layout (matches
+native_p2p_go/pkg/gwell/discovery.go):
+
+    header  uint32 LE   entry count
+    entry   36 bytes, repeated:
+        0   4   IPv4 address (network order)
+        4  16   IPv6 address (zeros when IPv4-only)
+       20   2   ip_version, LE (1 = IPv4)
+       22   2   server id, LE
+       24   2   port, BE
+       26   2   port2, BE (normally equal to port)
+       28   4   stamp, LE (opaque)
+       32   4   level, LE (0 in every capture so far)
+"""
+import logging
+import os
+import re
+import struct
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger("cryze_api.p2p_servers")
+
+HEADER = struct.Struct("<I")
+# Ports are big-endian inside an otherwise little-endian entry; they're read as LE and swapped
+ENTRY = struct.Struct("<4B16sHHHHII")
+ENTRY_SIZE = ENTRY.size  # 36
+# Sanity bound on the header count; real lists hold a handful of servers
+MAX_ENTRIES = 256
+
+# "ivCommonSetCb type:3, data:[3, 0, 0, 0, ...], len:368" as written by MessageMgr
+_LOG_CAPTURE = re.compile(r"type:(\d+),\s*data:\[([-\d,\s]*)\]")
+_ZERO_IPV6 = bytes(16)
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class P2PFormatError(ValueError):
+    pass
+
+
+class P2PServer(NamedTuple):
+    ip: str
+    port: int
+    server_id: int
+    level: int
+    ip_version: int
+    port2: int
+    stamp: int
+    ipv6: Optional[str] = None
+
+    @property
+    def addr(self) -> str:
+        return f"{self.ip}:{self.port}"
+
+
+class RankedServer(NamedTuple):
+    server: P2PServer
+    sightings: int  # captures that listed this ip:port
+    last_seen: float  # newest capture mtime (or 0 for in-memory captures)
+
+
+def _swap16(value: int) -> int:
+    return ((value & 0xFF) << 8) | (value >> 8)
+
+
+def _format_ipv6(raw: bytes) -> Optional[str]:
+    if raw == _ZERO_IPV6:
+        return None
+    return ":".join(f"{raw[i] << 8 | raw[i + 1]:x}" for i in range(0, 16, 2))
+
+
+def parse_server_list(data: Buffer) -> List[P2PServer]:
+    """Decodes one p2pSave blob. Entries with an all-zero IPv4 address are skipped.
+
+    Raises P2PFormatError when the header is missing or claims more entries
+    than the blob holds. Trailing bytes after the last entry are ignored (the
+    SDK pads the file).
+    """
+    view = memoryview(data).cast("B")
+    if len(view) < HEADER.size:
+        raise P2PFormatError(f"blob too short for header: {len(view)} bytes")
+    (count,) = HEADER.unpack_from(view, 0)
+    end = HEADER.size + count * ENTRY_SIZE
+    if count > MAX_ENTRIES or end > len(view):
+        raise P2PFormatError(f"header claims {count} entries but blob holds {(len(view) - HEADER.size) // ENTRY_SIZE}")
+
+    servers = []
+    for a, b, c, d, ipv6, ip_version, server_id, port, port2, stamp, level in ENTRY.iter_unpack(view[HEADER.size:end]):
+        if not (a or b or c or d):
+            continue
+        servers.append(P2PServer(
+            ip=f"{a}.{b}.{c}.{d}",
+            port=_swap16(port),
+            server_id=server_id,
+            level=level,
+            ip_version=ip_version,
+            port2=_swap16(port2),
+            stamp=stamp,
+            ipv6=_format_ipv6(ipv6),
+        ))
+    return servers
+
+
+def signed_bytes(values: Iterable[int]) -> bytes:
+    """Converts a Java byte[] dump (-128..127) to bytes."""
+    return bytes(v & 0xFF for v in values)
+
+
+def parse_log_captures(text: str) -> List[Tuple[int, bytes]]:
+    """Extracts every (type, blob) from ivCommonSetCb log lines."""
+    captures = []
+    for match in _LOG_CAPTURE.finditer(text):
+        values = [int(v) for v in match.group(2).split(",") if v.strip()]
+        captures.append((int(match.group(1)), signed_bytes(values)))
+    return captures
+
+
+def load_captures(path: str) -> List[Tuple[str, float, List[P2PServer]]]:
+    """Decodes every capture under a directory (or a single file).
+
+    *.p2p files are read as raw blobs; *.log and *.txt files are scanned for
+    ivCommonSetCb byte-array lines. Blobs that don't decode are logged and
+    skipped. Returns (source, mtime, servers) per decoded blob.
+    """
+    if os.path.isdir(path):
+        files = sorted(entry.path for entry in os.scandir(path) if entry.is_file())
+    else:
+        files = [path]
+
+    results = []
+    for file_path in files:
+        name = os.path.basename(file_path)
+        try:
+            mtime = os.path.getmtime(file_path)
+            if name.endswith(".p2p"):
+                with open(file_path, "rb") as f:
+                    blobs = [(name, f.read())]
+            elif name.endswith((".log", ".txt")):
+                with open(file_path, "r", errors="replace") as f:
+                    blobs = [(f"{name}#type{t}", blob) for t, blob in parse_log_captures(f.read())]
+            else:
+                continue
+        except OSError as e:
+            logger.warning(f"Cannot read P2P capture {file_path}: {e}")
+            continue
+        for source, blob in blobs:
+            try:
+                results.append((source, mtime, parse_server_list(blob)))
+            except P2PFormatError as e:
+                logger.debug(f"Skipping {source}: {e}")
+    return results
+
+
+def rank_servers(captures: Iterable[Tuple[str, float, List[P2PServer]]]) -> List[RankedServer]:
+    """Merges server lists by ip:port and orders them for connection attempts:
+    lowest level first, then servers seen in more captures, then most recently seen,
+    then the SDK's own list order. The newest capture's record wins for each address."""
+    merged: Dict[Tuple[str, int], List] = {}  # ip:port -> [server, sightings, last_seen, best position]
+    for _, mtime, servers in captures:
+        for position, server in enumerate(servers):
+            key = (server.ip, server.port)
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [server, 1, mtime, position]
+                continue
+            entry[1] += 1
+            entry[3] = min(entry[3], position)
+            if mtime >= entry[2]:
+                entry[0], entry[2] = server, mtime
+    ordered = sorted(merged.values(), key=lambda e: (e[0].level, -e[1], -e[2], e[3]))
+    return [RankedServer(server, sightings, last_seen) for server, sightings, last_seen, _ in ordered]
+
+
+class ServerDirectory:
+    """Ranked servers from a capture directory, re-decoded only when a file changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._signature: Optional[Tuple] = None
+        self._ranked: List[RankedServer] = []
+        self.loads = 0
+
+    def _scan(self) -> Tuple:
+        if not os.path.isdir(self.path):
+            return ()
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+            for entry in os.scandir(self.path) if entry.is_file()
+        ))
+
+    def ranked(self) -> List[RankedServer]:
+        signature = self._scan()
+        if signature != self._signature:
+            self._ranked = rank_servers(load_captures(self.path)) if signature else []
+            self._signature = signature
+            self.loads += 1
+        return self._ranked
@@ -0,0 +1,80 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("cryze_api.refresh_scheduler")
+
+
+class RefreshScheduler:
+    """Runs a refresh callable periodically and on demand from one background thread.
+
+    The callable returns True on success. Failures are retried with jittered
+    exponential backoff starting at `retry_base`, capped at `retry_max`.
+    An interval of 0 disables the periodic runs; trigger() still works.
+    """
+
+    def __init__(self, refresh: Callable[[], bool], interval: float, retry_base: float, retry_max: float):
+        self._refresh = refresh
+        self.interval = interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.runs = 0
+        self.consecutive_failures = 0
+        self.last_success: Optional[float] = None
+        self.next_run: Optional[float] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="camera-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self):
+        self._wake.set()
+
+    def _next_delay(self) -> Optional[float]:
+        if self.consecutive_failures:
+            delay = min(self.retry_max, self.retry_base * (2 ** (self.consecutive_failures - 1)))
+            return random.uniform(delay / 2, delay)
+        return self.interval if self.interval > 0 else None
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self._next_delay()
+            self.next_run = time.time() + delay if delay is not None else None
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.run_once()
+
+    def run_once(self) -> bool:
+        self.runs += 1
+        try:
+            ok = self._refresh()
+        except Exception as e:
+            logger.exception(f"Camera refresh failed: {e}")
+            ok = False
+        if ok:
+            self.consecutive_failures = 0
+            self.last_success = time.time()
+        else:
+            self.consecutive_failures += 1
+        return ok
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "intervalSeconds": self.interval,
+            "runs": self.runs,
+            "consecutiveFailures": self.consecutive_failures,
+            "lastSuccess": self.last_success,
+            "nextRun": self.next_run,
+        }
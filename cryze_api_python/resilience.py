@@ -0,0 +1,261 @@
+"""Circuit breakers and request deadlines for outbound Wyze/Mars calls.
+
+A deadline is an absolute time.monotonic() value kept in a context variable,
+so it follows a request into asyncio tasks and to_thread/threadpool calls.
+DeadlineMiddleware sets one for every incoming HTTP request; outbound calls
+size their timeouts with budget() and stop instead of starting work they
+can't finish.
+
+A CircuitBreaker guards one upstream endpoint. After `failure_threshold`
+consecutive outage errors (timeouts, connection errors, 5xx/429) it opens and
+calls fail immediately with CircuitOpenError, which carries how long until the
+next attempt. When that time passes, one probe call is let through (half-open):
+success closes the circuit, failure re-opens it with a doubled reset timeout.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import httpx
+import requests
+
+logger = logging.getLogger("cryze_api.resilience")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("cryze_deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def budget(default: float) -> float:
+    """`default` capped by what's left of the deadline. Raises DeadlineExceeded when nothing is left."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(default, left)
+
+
+@contextmanager
+def deadline_at(when: Optional[float]) -> Iterator[None]:
+    """Runs the block under an absolute deadline; an existing earlier deadline still wins."""
+    current = _deadline.get()
+    if when is None or (current is not None and current <= when):
+        yield
+        return
+    token = _deadline.set(when)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """Runs the block with no deadline, e.g. background work that a request merely kicked off
+    (tasks inherit the creating request's context)."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline(seconds: Optional[float]):
+    return deadline_at(None if seconds is None else time.monotonic() + seconds)
+
+
+def is_outage_error(error: BaseException) -> bool:
+    """True for errors that say the upstream is unavailable, as opposed to rejecting this particular call."""
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError, requests.Timeout, requests.ConnectionError,
+                          TimeoutError, ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0,
+                 on_state_change: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opens = 0  # consecutive opens without a successful probe
+        self._open_until = 0.0
+        self._probing = False
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self.last_error: Optional[str] = None
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        if state == self.OPEN:
+            logger.warning(f"Circuit {self.name} opened for {self._open_until - time.monotonic():.0f}s "
+                           f"after {self._failures} failures ({self.last_error})")
+        elif state == self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        if self.on_state_change:
+            self.on_state_change(self.name, state)
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+    def check(self):
+        """Raises CircuitOpenError if a call now would be rejected, without claiming the half-open probe."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            wait = self._open_until - time.monotonic()
+            if wait > 0 or self._probing:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, max(wait, 1.0))
+
+    def before_call(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            if self.state == self.CLOSED:
+                return
+            wait = self._open_until - time.monotonic()
+            if wait > 0 or self._probing:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, max(wait, 1.0))
+            self._probing = True
+            self._set_state(self.HALF_OPEN)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opens = 0
+            self._probing = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            if error is not None:
+                message = str(error).splitlines()[0] if str(error) else ""
+                self.last_error = f"{type(error).__name__}: {message}"[:200]
+            # Calls already in flight when the circuit opened don't extend it
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                timeout = min(self.max_reset_timeout, self.reset_timeout * (2 ** self._opens))
+                self._opens += 1
+                self._open_until = time.monotonic() + timeout
+                self._probing = False
+                self.stats["opened"] += 1
+                self._set_state(self.OPEN)
+
+    def _release_probe(self):
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                # Nothing learned; let the next caller probe
+                self._set_state(self.OPEN)
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Wraps one upstream call. Outage errors count as failures, anything else the upstream
+        answered with counts as success. A timeout caused by our own deadline counts as neither
+        and is re-raised as DeadlineExceeded."""
+        self.before_call()
+        try:
+            yield
+        except DeadlineExceeded:
+            self._release_probe()
+            raise
+        except Exception as e:
+            if not is_outage_error(e):
+                self.record_success()
+                raise
+            left = remaining()
+            if left is not None and left <= 0.05:
+                self._release_probe()
+                raise DeadlineExceeded(f"{self.name}: request deadline exceeded") from e
+            self.record_failure(e)
+            raise
+        except BaseException:
+            self._release_probe()
+            raise
+        else:
+            self.record_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutiveFailures": self._failures,
+                "retryAfter": round(max(0.0, self._open_until - time.monotonic()), 1) if self.state != self.CLOSED else 0.0,
+                "lastError": self.last_error,
+                **self.stats,
+            }
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving each HTTP request a deadline: the client's X-Request-Timeout
+    (seconds) when sent, otherwise `default`, never more than `maximum`. A default of 0
+    leaves requests without a deadline unless the client sends one."""
+
+    def __init__(self, app, default: float, maximum: float, header: str = "x-request-timeout"):
+        self.app = app
+        self.default = default
+        self.maximum = maximum
+        self.header = header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.default
+        for name, value in scope["headers"]:
+            if name == self.header:
+                try:
+                    seconds = float(value) if float(value) > 0 else seconds
+                except ValueError:
+                    pass
+                break
+        seconds = min(seconds, self.maximum) if self.maximum > 0 else seconds
+        if seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+        token = _deadline.set(time.monotonic() + seconds)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
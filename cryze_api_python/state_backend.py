@@ -0,0 +1,327 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("cryze_api.state")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    camera_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    ts REAL NOT NULL,
+    seq INTEGER NOT NULL,
+    origin TEXT NOT NULL,
+    PRIMARY KEY (camera_id, key)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_seq ON messages (seq);
+"""
+
+# (seq, camera_id, key, value, ts, origin)
+MessageRow = Tuple[int, str, str, str, float, str]
+
+
+class LocalBackend:
+    """Default backend: this process is the only worker and its in-memory state is the truth.
+
+    Every method is a no-op or returns "nothing shared", so callers can use
+    the same code path for both backends.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}"
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def read(self, name: str) -> Optional[Tuple[int, Any]]:
+        return None
+
+    def version(self, name: str) -> int:
+        return 0
+
+    def write(self, name: str, value: Any) -> int:
+        return 0
+
+    def update(self, name: str, mutate: Callable[[Optional[Any]], Any]) -> Tuple[int, Any]:
+        return 0, mutate(None)
+
+    def bump(self, name: str) -> int:
+        return 0
+
+    def append_messages(self, camera_id: str, updates: Dict[str, str], ts: float):
+        pass
+
+    def messages_since(self, seq: int, limit: int = 5000) -> List[MessageRow]:
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "local", "workerId": self.worker_id}
+
+
+class SqliteBackend(LocalBackend):
+    """State shared by every worker on the host through one SQLite (WAL) file.
+
+    Named documents (inventory, overrides, counters) live in `state` with a
+    version that only moves forward. Message updates are queued and upserted in
+    batches by a writer thread, each changed value getting the next global seq,
+    so other workers can replay what they haven't seen with messages_since().
+    The same seq, with an epoch kept in the database, makes the /messages delta
+    cursors of changes_since() valid on every worker.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, flush_interval: float = 0.05, batch_size: int = 1000, max_queue: int = 50000):
+        super().__init__()
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._queue: "queue.Queue[Optional[Tuple[str, str, str, float]]]" = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self.messages_epoch: Optional[str] = None
+        self.counters = {"written": 0, "dropped": 0, "batches": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; request handlers run on the threadpool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        if self._thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        # Created once per database, so it only changes when the message seq could start over
+        self.messages_epoch = self.update("messages_epoch", lambda epoch: epoch or uuid.uuid4().hex[:8])[1]
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Shared state at {self.path} (worker {self.worker_id})")
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def read(self, name: str) -> Optional[Tuple[int, Any]]:
+        row = self._conn().execute("SELECT version, value FROM state WHERE name = ?", (name,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def version(self, name: str) -> int:
+        row = self._conn().execute("SELECT version FROM state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def write(self, name: str, value: Any) -> int:
+        return self.update(name, lambda _: value)[0]
+
+    def update(self, name: str, mutate: Callable[[Optional[Any]], Any]) -> Tuple[int, Any]:
+        """Atomic read-modify-write: mutate(current value or None) runs with the database write-locked."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version, value FROM state WHERE name = ?", (name,)).fetchone()
+            value = mutate(json.loads(row[1]) if row else None)
+            version = (row[0] if row else 0) + 1
+            conn.execute(
+                "INSERT INTO state (name, version, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET version = excluded.version, value = excluded.value",
+                (name, version, json.dumps(value, separators=(",", ":")))
+            )
+            conn.execute("COMMIT")
+            return version, value
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def bump(self, name: str) -> int:
+        return self.update(name, lambda value: None)[0]
+
+    def append_messages(self, camera_id: str, updates: Dict[str, str], ts: float):
+        for key, value in updates.items():
+            try:
+                self._queue.put_nowait((camera_id, key, value, ts))
+            except queue.Full:
+                self.counters["dropped"] += 1
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            running = True
+            while running:
+                batch: List[Tuple[str, str, str, float]] = []
+                try:
+                    item = self._queue.get(timeout=1.0)
+                    deadline = time.monotonic() + self.flush_interval
+                    while item is not None:
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        item = self._queue.get(timeout=remaining)
+                    if item is None:
+                        running = False
+                except queue.Empty:
+                    pass
+                if batch:
+                    try:
+                        self._write_messages(conn, batch)
+                    except sqlite3.Error as e:
+                        logger.error(f"Shared state write failed, dropped {len(batch)} messages: {e}")
+                        self.counters["dropped"] += len(batch)
+        finally:
+            conn.close()
+
+    def _write_messages(self, conn: sqlite3.Connection, batch: List[Tuple[str, str, str, float]]):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version FROM state WHERE name = 'messages_seq'").fetchone()
+            seq = row[0] if row else 0
+            for camera_id, key, value, ts in batch:
+                cur = conn.execute(
+                    "INSERT INTO messages (camera_id, key, value, ts, seq, origin) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(camera_id, key) DO UPDATE SET value = excluded.value, ts = excluded.ts, "
+                    "seq = excluded.seq, origin = excluded.origin WHERE messages.value != excluded.value",
+                    (camera_id, key, value, ts, seq + 1, self.worker_id)
+                )
+                if cur.rowcount:
+                    seq += 1
+            conn.execute(
+                "INSERT INTO state (name, version, value) VALUES ('messages_seq', ?, 'null') "
+                "ON CONFLICT(name) DO UPDATE SET version = excluded.version",
+                (seq,)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+
+    def messages_since(self, seq: int, limit: int = 5000) -> List[MessageRow]:
+        return self._conn().execute(
+            "SELECT seq, camera_id, key, value, ts, origin FROM messages WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, limit)
+        ).fetchall()
+
+    def changes_since(self, cursor: Optional[str], camera_id: Optional[str] = None,
+                      prefix: Optional[str] = None) -> Dict[str, Any]:
+        """MessageStore.changes_since() answered from the shared table, so a cursor handed out by
+        one worker can be polled on any other. Keys are never evicted here, so `removed` is empty."""
+        since: Optional[int] = None
+        if cursor:
+            epoch, _, seq = cursor.partition("-")
+            if epoch == self.messages_epoch and seq.isdigit():
+                since = int(seq)
+        conn = self._conn()
+        # One read transaction, so the cursor and the rows come from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT version FROM state WHERE name = 'messages_seq'").fetchone()
+            current = row[0] if row else 0
+            if since is not None and since > current:
+                since = None
+            clauses, params = [], []
+            if since is not None:
+                clauses.append("seq > ?")
+                params.append(since)
+            if camera_id is not None:
+                clauses.append("camera_id = ?")
+                params.append(camera_id)
+            if prefix:
+                clauses.append("substr(key, 1, ?) = ?")
+                params.extend((len(prefix), prefix))
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(f"SELECT camera_id, key, value FROM messages{where} ORDER BY seq", params).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        messages: Dict[str, Dict[str, str]] = {}
+        for cam, key, value in rows:
+            messages.setdefault(cam, {})[key] = value
+        return {"cursor": f"{self.messages_epoch}-{current}", "full": since is None, "messages": messages, "removed": {}}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path, "workerId": self.worker_id,
+                "queued": self._queue.qsize(), **self.counters}
+
+
+class LeaderLock:
+    """Single-worker election with an exclusive flock on a lock file.
+
+    The kernel drops the lock when its holder exits, so a surviving worker
+    takes over on its next try_acquire().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+def create_backend(kind: str, path: str) -> LocalBackend:
+    if kind == "sqlite":
+        return SqliteBackend(path)
+    if kind != "local":
+        logger.warning(f"Unknown STATE_BACKEND {kind!r}, using local")
+    return LocalBackend()
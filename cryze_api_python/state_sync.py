@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from event_broker import EventBroker
+from message_store import MessageStore
+from state_backend import LeaderLock, LocalBackend
+
+logger = logging.getLogger("cryze_api.state_sync")
+
+
+class StateSync:
+    """Keeps this worker in step with the others through the shared state backend.
+
+    Every `interval` seconds: followers retry the leader lock, adopt the
+    leader's inventory and Wyze session; the leader publishes its inventory and
+    serves refresh/re-auth requests forwarded by followers; every worker reloads
+    overrides edited elsewhere and replays camera messages other workers received.
+
+    `manager` is the app's WyzeManager; winning the lock calls `on_promote`.
+    """
+
+    def __init__(self, backend: LocalBackend, manager: Any, leader_lock: LeaderLock, messages: MessageStore,
+                 events: EventBroker, session_file: str, on_promote: Callable[[], None], interval: float):
+        self.backend = backend
+        self.manager = manager
+        self.leader_lock = leader_lock
+        self.messages = messages
+        self.events = events
+        self.session_file = session_file
+        self.on_promote = on_promote
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._published: Optional[Tuple[int, str, str, bool]] = None
+        self._versions: Dict[str, Optional[int]] = {"inventory": None, "refresh_requests": None, "auth_expired": None}
+        self._session_mtime: Optional[float] = None
+        self.message_seq = 0
+        self.cycles = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="state-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # The first pass loads messages already in the store without re-announcing them over SSE
+        publish = False
+        while not self._stop.is_set():
+            try:
+                self.run_once(publish)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"State sync failed: {e}")
+            publish = True
+            self._stop.wait(self.interval)
+
+    def run_once(self, publish: bool = True):
+        if not self.manager.is_leader and self.leader_lock.try_acquire():
+            self.on_promote()
+        self.manager.sync_overrides()
+        if self.manager.is_leader:
+            self._publish_inventory()
+            self._serve_requests()
+        else:
+            self._adopt_inventory()
+            self._adopt_session()
+        self._replay_messages(publish)
+        self.cycles += 1
+
+    def _changed(self, name: str) -> bool:
+        """True when `name` moved since the last check; the first check only records the baseline."""
+        version = self.backend.version(name)
+        previous, self._versions[name] = self._versions[name], version
+        return previous is not None and version != previous
+
+    def _publish_inventory(self):
+        manager = self.manager
+        version, cameras = manager.get_inventory()
+        current = (version, manager.boot_id, manager.inventory_source, manager._ready)
+        if current == self._published:
+            return
+        self.backend.write("inventory", {
+            "version": version,
+            "bootId": manager.boot_id,
+            "source": manager.inventory_source,
+            "ready": manager._ready,
+            "cameras": jsonable_encoder(cameras)
+        })
+        self._published = current
+
+    def _serve_requests(self):
+        manager = self.manager
+        if self._changed("refresh_requests"):
+            manager.refresh_scheduler.trigger()
+        if self._changed("auth_expired"):
+            shared = self.backend.read("auth_expired")
+            if shared and manager.client is not None and shared[1] == manager.client._token:
+                manager.handle_expired_token(shared[1])
+
+    def _adopt_inventory(self):
+        version = self.backend.version("inventory")
+        if version == self._versions["inventory"]:
+            return
+        self._versions["inventory"] = version
+        shared = self.backend.read("inventory")
+        if shared is not None:
+            self.manager.adopt_inventory(shared[1])
+
+    def _adopt_session(self):
+        try:
+            mtime = os.path.getmtime(self.session_file)
+        except OSError:
+            return
+        if mtime != self._session_mtime:
+            self._session_mtime = mtime
+            self.manager.adopt_session()
+
+    def _replay_messages(self, publish: bool):
+        while True:
+            rows = self.backend.messages_since(self.message_seq)
+            if not rows:
+                return
+            by_camera: Dict[str, Dict[str, str]] = {}
+            for seq, camera_id, key, value, ts, origin in rows:
+                if origin == self.backend.worker_id:
+                    continue
+                self.messages.update(camera_id, {key: value}, ts)
+                by_camera.setdefault(camera_id, {})[key] = value
+            self.message_seq = rows[-1][0]
+            if publish:
+                for camera_id, updates in by_camera.items():
+                    self.events.publish("camera_message", {"cameraId": camera_id, "updates": updates})
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"cycles": self.cycles, "errors": self.errors, "messageSeq": self.message_seq}
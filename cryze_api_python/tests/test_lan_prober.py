@@ -0,0 +1,88 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from lan_prober import LanProber
+
+
+@pytest.fixture
+def listener():
+    """A localhost port that accepts connections."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def silent_port():
+    """A localhost port that never answers: its accept queue is full, so new SYNs are dropped."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(0)
+    port = server.getsockname()[1]
+    clients = []
+    for _ in range(3):
+        client = socket.socket()
+        client.setblocking(False)
+        client.connect_ex(("127.0.0.1", port))
+        clients.append(client)
+    time.sleep(0.1)
+    yield port
+    for client in clients:
+        client.close()
+    server.close()
+
+
+def probe(port, ip="127.0.0.1", timeout=0.5):
+    return asyncio.run(LanProber(lambda: {}, port=port, timeout=timeout).probe(ip))
+
+
+def test_listening_port_is_reachable_with_rtt(listener):
+    result = probe(listener)
+    assert result.reachable
+    assert result.rtt is not None and 0 <= result.rtt < 0.5
+    assert result.error is None
+
+
+def test_silent_port_is_unreachable(silent_port):
+    result = probe(silent_port, timeout=0.3)
+    assert not result.reachable
+    assert result.rtt is None
+    assert result.error == "timeout"
+
+
+def test_refused_connection_counts_as_answered():
+    # Cameras needn't listen on the probe port; a RST still proves the host is on the LAN
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    server.close()
+    result = probe(port)
+    assert result.reachable and result.rtt is not None
+
+
+def test_invalid_address_is_unreachable(listener):
+    # "a..b" fails IDNA encoding with UnicodeError (a ValueError) before any connect
+    result = probe(listener, ip="a..b")
+    assert not result.reachable
+    assert result.error.startswith("invalid address")
+
+
+def test_probe_all_reuses_cached_results_unless_forced(listener):
+    prober = LanProber(lambda: {}, port=listener, timeout=0.5, interval=60)
+
+    async def run():
+        first = await prober.probe_all(["127.0.0.1", "127.0.0.1"])
+        assert prober.probes == 1
+        again = await prober.probe_all(["127.0.0.1"])
+        assert prober.probes == 1
+        assert again["127.0.0.1"] is first["127.0.0.1"]
+        forced = await prober.probe_all(["127.0.0.1"], force=True)
+        assert prober.probes == 2
+        assert forced["127.0.0.1"] is not first["127.0.0.1"]
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+from p2p_servers import (P2PFormatError, ServerDirectory, load_captures, parse_log_captures, parse_server_list,
+                         rank_servers, signed_bytes)
+
+# The capture and expected decode live with the analysis script, so both check the same data
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "native_p2p_go"))
+from analyze_p2p import EXPECTED, check_builtin_capture, raw  # noqa: E402
+
+BLOB = signed_bytes(raw)
+LOG_LINE = f"ivCommonSetCb type:3, data:[{', '.join(map(str, raw))}], len:{len(raw)}"
+
+
+def test_builtin_capture_decodes_to_the_logged_servers():
+    servers = parse_server_list(BLOB)
+    assert [(s.ip, s.port, s.server_id, s.level) for s in servers] == EXPECTED
+    assert all(s.ip_version == 1 and s.port2 == s.port and s.ipv6 is None for s in servers)
+
+
+def test_analyze_script_check_passes(capsys):
+    check_builtin_capture()
+    assert capsys.readouterr().out.endswith("OK\n")
+
+
+def test_trailing_padding_is_ignored():
+    assert parse_server_list(BLOB + bytes(256)) == parse_server_list(BLOB)
+
+
+@pytest.mark.parametrize("blob", [b"", b"\x03\x00", BLOB[:-1], b"\xff\xff\x00\x00" + BLOB[4:]])
+def test_truncated_or_oversized_blobs_are_rejected(blob):
+    with pytest.raises(P2PFormatError):
+        parse_server_list(blob)
+
+
+def test_log_lines_are_extracted():
+    assert parse_log_captures(f"I MessageMgr: {LOG_LINE}\nunrelated\n") == [(3, BLOB)]
+
+
+def test_load_captures_reads_blobs_and_logs(tmp_path):
+    (tmp_path / "3.p2p").write_bytes(BLOB)
+    (tmp_path / "logcat.txt").write_text(f"{LOG_LINE}\nivCommonSetCb type:9, data:[1, 0], len:2\n")
+    (tmp_path / "notes.md").write_text("ignored")
+    captures = load_captures(str(tmp_path))
+    # The undecodable type 9 blob is skipped
+    assert [source for source, _, _ in captures] == ["3.p2p", "logcat.txt#type3"]
+    assert all(len(servers) == 3 for _, _, servers in captures)
+
+
+def test_rank_prefers_servers_seen_more_often():
+    servers = parse_server_list(BLOB)
+    ranked = rank_servers([("old", 1.0, servers), ("new", 2.0, servers[1:])])
+    assert [r.server.ip for r in ranked] == ["52.201.137.206", "35.81.136.54", "3.13.212.24"]
+    assert [r.sightings for r in ranked] == [2, 2, 1]
+    assert ranked[0].last_seen == 2.0
+
+
+def test_server_directory_reloads_only_on_change(tmp_path):
+    directory = ServerDirectory(str(tmp_path))
+    assert directory.ranked() == []
+    (tmp_path / "3.p2p").write_bytes(BLOB)
+    assert len(directory.ranked()) == 3
+    directory.ranked()
+    assert directory.loads == 2
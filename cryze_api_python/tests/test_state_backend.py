@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from state_backend import SqliteBackend
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two backends on one database, as two uvicorn workers would have."""
+    path = str(tmp_path / "state.db")
+    backends = [SqliteBackend(path), SqliteBackend(path)]
+    for backend in backends:
+        backend.start()
+    yield backends
+    for backend in backends:
+        backend.stop()
+
+
+def test_epoch_is_shared(workers):
+    a, b = workers
+    assert a.messages_epoch == b.messages_epoch
+
+
+def test_cursor_from_one_worker_is_a_delta_on_another(workers):
+    a, b = workers
+    a.append_messages("GW_A", {"MSG::battery": "80", "MSG::wifi": "-50"}, time.time())
+    wait_for(lambda: b.changes_since(None)["messages"])
+
+    first = b.changes_since("")
+    assert first["full"]
+    assert first["messages"] == {"GW_A": {"MSG::battery": "80", "MSG::wifi": "-50"}}
+
+    b.append_messages("GW_A", {"MSG::battery": "79"}, time.time())
+    b.append_messages("GW_B", {"MSG::battery": "100"}, time.time())
+    wait_for(lambda: a.changes_since(first["cursor"])["messages"].get("GW_B"))
+
+    delta = a.changes_since(first["cursor"])
+    assert not delta["full"]
+    assert delta["messages"] == {"GW_A": {"MSG::battery": "79"}, "GW_B": {"MSG::battery": "100"}}
+    assert delta["removed"] == {}
+
+    again = b.changes_since(delta["cursor"])
+    assert not again["full"] and again["messages"] == {}
+    assert again["cursor"] == delta["cursor"]
+
+
+def test_unchanged_value_does_not_move_the_cursor(workers):
+    a, b = workers
+    a.append_messages("GW_A", {"MSG::battery": "80"}, time.time())
+    wait_for(lambda: b.changes_since(None)["messages"])
+    cursor = b.changes_since(None)["cursor"]
+    a.append_messages("GW_A", {"MSG::battery": "80"}, time.time())
+    wait_for(lambda: a.counters["batches"] == 2)
+    assert b.changes_since(cursor) == {"cursor": cursor, "full": False, "messages": {}, "removed": {}}
+
+
+def test_filters_and_foreign_cursors(workers):
+    a, b = workers
+    a.append_messages("GW_A", {"MSG_TYPE_PRO::x": "1", "OTHER::y": "2"}, time.time())
+    a.append_messages("GW_B", {"MSG_TYPE_PRO::x": "3"}, time.time())
+    wait_for(lambda: len(b.changes_since(None)["messages"]) == 2)
+
+    assert b.changes_since(None, camera_id="GW_A", prefix="MSG_TYPE_PRO")["messages"] == {"GW_A": {"MSG_TYPE_PRO::x": "1"}}
+    for cursor in ("deadbeef-0", f"{a.messages_epoch}-999999", "garbage"):
+        assert b.changes_since(cursor)["full"]
@@ -0,0 +1,398 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from resilience import CircuitOpenError, DeadlineExceeded, current_deadline, deadline_at, detached, remaining
+from state_backend import LocalBackend
+
+logger = logging.getLogger("cryze_api.tokens")
+
+
+class AccessCredential(BaseModel):
+    accessId: str
+    accessToken: str
+
+
+class TokenScheduler:
+    """Admission control for Mars token fetches.
+
+    At most `max_concurrency` Mars calls run at once and at most one per camera.
+    Further requests for a camera queue behind its in-flight fetch (each caller
+    still gets its own fresh token), and cameras with queued requests are served
+    round-robin so one busy camera can't starve the rest. Failed fetches are
+    retried with jittered exponential backoff.
+
+    Each request carries its caller's deadline: the caller stops waiting when it
+    passes (DeadlineExceeded), and the fetch serving it runs under that deadline,
+    so it neither retries nor waits on Mars past it.
+    """
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Optional[AccessCredential]]],
+                 max_concurrency: int, max_attempts: int, backoff_base: float, backoff_max: float):
+        self._fetch = fetch
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pending: Dict[str, Deque[Tuple[float, asyncio.Future, Optional[float]]]] = {}
+        self._ready: Deque[str] = deque()  # cameras with queued requests and nothing in flight
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats = {"requests": 0, "fetched": 0, "failed": 0, "retries": 0, "handedOver": 0, "expired": 0}
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def fetch(self, device_id: str) -> Optional[AccessCredential]:
+        future = asyncio.get_running_loop().create_future()
+        deadline = current_deadline()
+        self._pending.setdefault(device_id, deque()).append((time.monotonic(), future, deadline))
+        self.stats["requests"] += 1
+        if device_id not in self._in_flight and device_id not in self._ready:
+            self._ready.append(device_id)
+        self._dispatch()
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.stats["expired"] += 1
+            raise DeadlineExceeded(f"No Mars token for {device_id} before the request deadline")
+
+    def _next_waiter(self, device_id: str) -> Optional[Tuple[asyncio.Future, Optional[float]]]:
+        queue = self._pending.get(device_id)
+        while queue:
+            enqueued_at, future, deadline = queue.popleft()
+            if future.done():  # caller went away while queued
+                continue
+            wait = time.monotonic() - enqueued_at
+            self._wait_count += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            return future, deadline
+        self._pending.pop(device_id, None)
+        return None
+
+    def _dispatch(self):
+        while self._ready and len(self._in_flight) < self.max_concurrency:
+            device_id = self._ready.popleft()
+            waiter = self._next_waiter(device_id)
+            if waiter is not None:
+                self._in_flight[device_id] = asyncio.create_task(self._run(device_id, *waiter))
+
+    async def _fetch_with_backoff(self, device_id: str) -> Optional[AccessCredential]:
+        for attempt in range(self.max_attempts):
+            if attempt:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                delay = random.uniform(delay / 2, delay)
+                left = remaining()
+                if left is not None and left <= delay:
+                    break  # the caller would be gone before the retry finished
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+            cred = await self._fetch(device_id)
+            if cred is not None:
+                return cred
+        return None
+
+    async def _run(self, device_id: str, future: asyncio.Future, deadline: Optional[float]):
+        try:
+            # The task inherited whichever request dispatched it; run under this waiter's deadline instead
+            with detached(), deadline_at(deadline):
+                cred = await self._fetch_with_backoff(device_id)
+            self.stats["fetched" if cred else "failed"] += 1
+            if future.done() and cred is not None:
+                # Original caller gave up; the token is still unused, so give it to the next one in line
+                waiter = self._next_waiter(device_id)
+                future = waiter[0] if waiter is not None else None
+                if future is not None:
+                    self.stats["handedOver"] += 1
+            if future is not None and not future.done():
+                future.set_result(cred)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if future is not None and not future.done():
+                future.set_exception(e)
+        finally:
+            del self._in_flight[device_id]
+            if self._pending.get(device_id):
+                self._ready.append(device_id)
+            self._dispatch()
+
+    async def stop(self):
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for queue in self._pending.values():
+            for _, future, _ in queue:
+                future.cancel()
+        self._pending.clear()
+        self._ready.clear()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "maxConcurrency": self.max_concurrency,
+            "inFlight": self.in_flight,
+            "queueDepth": self.queue_depth,
+            **self.stats,
+            "waitCount": self._wait_count,
+            "avgWaitMs": round(self._wait_total / self._wait_count * 1000, 1) if self._wait_count else 0.0,
+            "maxWaitMs": round(self._wait_max * 1000, 1),
+            "cameras": {
+                device_id: {
+                    "queued": len(queue),
+                    "oldestWaitMs": round((now - queue[0][0]) * 1000, 1) if queue else None,
+                }
+                for device_id, queue in self._pending.items() if queue
+            },
+        }
+
+
+class TokenReservoir:
+    """Holds up to `size` pre-minted Mars tokens per camera.
+
+    Tokens stay single-use: each one is popped and handed out exactly once, and
+    anything older than `max_age` is discarded unused. Refills run as background
+    tasks on the event loop, so a hit never waits on the Mars round trip. Only
+    while start()'s `ready` holds does this worker mint; take() works regardless.
+    """
+
+    # Token ages are measured with this clock
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Optional[AccessCredential]]],
+                 size: int, max_age: float, refill_interval: float):
+        self._fetch = fetch
+        self.size = size
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+        self._tokens: Dict[str, Deque[Tuple[float, AccessCredential]]] = {}
+        self._refilling: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._can_mint: Callable[[], bool] = lambda: False
+        self._device_ids: Callable[[], List[str]] = lambda: []
+        # Recently served tokens, used only to prove nothing is ever handed out twice
+        self._served: Deque[str] = deque(maxlen=4096)
+        self._served_set = set()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "minted": 0, "mintFailures": 0, "reissued": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    # Token storage. The shared subclass keeps the same operations in the state backend.
+
+    def _prune(self, device_id: str, now: float):
+        tokens = self._tokens.get(device_id)
+        while tokens and now - tokens[0][0] > self.max_age:
+            tokens.popleft()
+            self.stats["expired"] += 1
+
+    def _pop(self, device_id: str) -> Optional[AccessCredential]:
+        self._prune(device_id, self.clock())
+        tokens = self._tokens.get(device_id)
+        return tokens.popleft()[1] if tokens else None
+
+    def _push(self, device_id: str, cred: AccessCredential):
+        self._tokens.setdefault(device_id, deque()).append((self.clock(), cred))
+
+    def _available(self, device_id: str) -> int:
+        return len(self._tokens.get(device_id, ()))
+
+    def _retain(self, wanted: Set[str]):
+        """Drops the tokens of cameras no longer in the inventory and every expired one."""
+        now = self.clock()
+        for device_id in list(self._tokens):
+            if device_id not in wanted:
+                del self._tokens[device_id]
+        for device_id in wanted:
+            self._prune(device_id, now)
+
+    def _levels(self) -> Dict[str, Tuple[int, Optional[float]]]:
+        """{device_id: (available, minted_at of the oldest)}"""
+        return {device_id: (len(tokens), tokens[0][0] if tokens else None) for device_id, tokens in self._tokens.items()}
+
+    async def _store(self, operation: Callable[..., Any], *args: Any) -> Any:
+        return operation(*args)
+
+    def _mark_served(self, cred: AccessCredential) -> bool:
+        if cred.accessToken in self._served_set:
+            self.stats["reissued"] += 1
+            return False
+        if len(self._served) == self._served.maxlen:
+            self._served_set.discard(self._served[0])
+        self._served.append(cred.accessToken)
+        self._served_set.add(cred.accessToken)
+        return True
+
+    async def take(self, device_id: str) -> Optional[AccessCredential]:
+        """Pops a fresh token for device_id, or returns None on a miss.
+
+        A hit schedules a refill when this worker mints and the camera is in the inventory, so
+        unknown ids never cause Mars calls. A miss doesn't: the caller's own fetch stands in for
+        it, and the maintenance loop tops the camera up on its next pass."""
+        if not self.enabled:
+            return None
+        cred = None
+        while cred is None:
+            candidate = await self._store(self._pop, device_id)
+            if candidate is None:
+                break
+            if self._mark_served(candidate):
+                cred = candidate
+        self.stats["hits" if cred else "misses"] += 1
+        if cred is not None and self._can_mint() and device_id in self._device_ids():
+            self._request_refill(device_id)
+        return cred
+
+    def _request_refill(self, device_id: str):
+        if device_id not in self._refilling:
+            self._refilling[device_id] = asyncio.create_task(self._refill(device_id))
+
+    async def _refill(self, device_id: str):
+        try:
+            # Started from a request's take(), but not bound by that request's deadline
+            with detached():
+                while await self._store(self._available, device_id) < self.size:
+                    try:
+                        cred = await self._fetch(device_id)
+                    except CircuitOpenError:
+                        cred = None
+                    if cred is None:
+                        self.stats["mintFailures"] += 1
+                        break
+                    await self._store(self._push, device_id, cred)
+                    self.stats["minted"] += 1
+        finally:
+            self._refilling.pop(device_id, None)
+
+    async def _maintain(self):
+        while True:
+            try:
+                if self._can_mint():
+                    wanted = set(self._device_ids())
+                    await self._store(self._retain, wanted)
+                    for device_id in wanted:
+                        self._request_refill(device_id)
+            except Exception as e:
+                logger.exception(f"Token reservoir maintenance failed: {e}")
+            await asyncio.sleep(self.refill_interval)
+
+    def start(self, device_ids: Callable[[], List[str]], ready: Callable[[], bool]):
+        """Starts keeping every camera in device_ids() topped up for as long as ready() holds."""
+        if self.enabled and self._task is None:
+            self._can_mint = ready
+            self._device_ids = device_ids
+            self._task = asyncio.create_task(self._maintain())
+            logger.info(f"Token reservoir enabled: {self.size} tokens/camera, max age {self.max_age}s")
+
+    async def stop(self):
+        self._can_mint = lambda: False
+        tasks = list(self._refilling.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tokens.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "maxAgeSeconds": self.max_age,
+            **self.stats,
+            "cameras": {
+                device_id: {
+                    "available": available,
+                    "oldestAgeSeconds": round(now - oldest, 1) if oldest is not None else None,
+                }
+                for device_id, (available, oldest) in self._levels().items()
+            },
+        }
+
+
+class SharedTokenReservoir(TokenReservoir):
+    """TokenReservoir whose tokens live in the shared state backend, so every worker draws
+    from the one set the leader mints. Pops are atomic read-modify-writes of one document,
+    which keeps tokens single-use across workers; ages use wall-clock time."""
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, state: LocalBackend, fetch: Callable[[str], Awaitable[Optional[AccessCredential]]],
+                 size: int, max_age: float, refill_interval: float, name: str = "token_reservoir"):
+        super().__init__(fetch, size=size, max_age=max_age, refill_interval=refill_interval)
+        self.state = state
+        self.name = name
+
+    def _fresh(self, entries: List[List[Any]], now: float) -> List[List[Any]]:
+        fresh = [entry for entry in entries if now - entry[0] <= self.max_age]
+        self.stats["expired"] += len(entries) - len(fresh)
+        return fresh
+
+    def _pop(self, device_id: str) -> Optional[AccessCredential]:
+        popped: List[List[Any]] = []
+
+        def mutate(doc: Optional[Dict[str, List[List[Any]]]]) -> Dict[str, List[List[Any]]]:
+            doc = doc or {}
+            entries = self._fresh(doc.pop(device_id, []), self.clock())
+            if entries:
+                popped.append(entries.pop(0))
+            if entries:
+                doc[device_id] = entries
+            return doc
+
+        self.state.update(self.name, mutate)
+        if not popped:
+            return None
+        _, access_id, access_token = popped[0]
+        return AccessCredential(accessId=access_id, accessToken=access_token)
+
+    def _push(self, device_id: str, cred: AccessCredential):
+        def mutate(doc: Optional[Dict[str, List[List[Any]]]]) -> Dict[str, List[List[Any]]]:
+            doc = doc or {}
+            doc.setdefault(device_id, []).append([self.clock(), cred.accessId, cred.accessToken])
+            return doc
+
+        self.state.update(self.name, mutate)
+
+    def _read(self) -> Dict[str, List[List[Any]]]:
+        shared = self.state.read(self.name)
+        return shared[1] if shared else {}
+
+    def _available(self, device_id: str) -> int:
+        now = self.clock()
+        return sum(1 for entry in self._read().get(device_id, []) if now - entry[0] <= self.max_age)
+
+    def _retain(self, wanted: Set[str]):
+        def mutate(doc: Optional[Dict[str, List[List[Any]]]]) -> Dict[str, List[List[Any]]]:
+            now = self.clock()
+            kept = {device_id: self._fresh(entries, now) for device_id, entries in (doc or {}).items()
+                    if device_id in wanted}
+            return {device_id: entries for device_id, entries in kept.items() if entries}
+
+        self.state.update(self.name, mutate)
+
+    def _levels(self) -> Dict[str, Tuple[int, Optional[float]]]:
+        return {device_id: (len(entries), entries[0][0] if entries else None)
+                for device_id, entries in self._read().items()}
+
+    async def _store(self, operation: Callable[..., Any], *args: Any) -> Any:
+        # SQLite may wait on another worker's write lock; keep that off the event loop
+        return await asyncio.to_thread(operation, *args)
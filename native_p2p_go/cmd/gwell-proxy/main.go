@@ -1,8 +1,10 @@
 package main
 
 import (
+	"errors"
 	"log"
 	"os"
+	"time"
 
 	"github.com/wlatic/cryze_v2/native_p2p_go/pkg/gwell"
 	"github.com/wlatic/cryze_v2/native_p2p_go/pkg/wyze"
@@ -18,22 +20,19 @@ func main() {
 	// Phase 1: Get camera list and tokens from Python API
 	client := wyze.NewClient(apiURL)
 
-	cameras, err := client.GetCameraList()
+	inventory, _, _, err := client.GetInventory("")
 	if err != nil {
-		log.Fatalf("Failed to get camera list: %v", err)
+		log.Fatalf("Failed to get camera inventory: %v", err)
 	}
-	log.Printf("Found %d cameras: %v", len(cameras), cameras)
+	log.Printf("Found %d cameras (inventory v%d)", len(inventory.Cameras), inventory.Version)
 
 	// For each camera, get token and start P2P
-	for _, camID := range cameras {
-		info, err := client.GetDeviceInfo(camID)
-		if err != nil {
-			log.Printf("Failed to get info for %s: %v", camID, err)
-			continue
-		}
+	for i := range inventory.Cameras {
+		info := &inventory.Cameras[i]
+		camID := info.CameraID
 		log.Printf("Camera %s -> stream: %s, IP: %s", camID, info.StreamName, info.LanIP)
 
-		token, err := client.GetCameraToken(camID)
+		token, err := getCameraToken(client, camID)
 		if err != nil {
 			log.Printf("Failed to get token for %s: %v", camID, err)
 			continue
@@ -72,6 +71,21 @@ func startCamera(camID string, info *wyze.DeviceInfo, token *wyze.AccessCredenti
 	// TODO: Phase 5: CALLING + Stream
 }
 
+// getCameraToken waits out the API's Retry-After while Wyze/Mars is down,
+// instead of failing the camera on the first 503.
+func getCameraToken(client *wyze.Client, camID string) (*wyze.AccessCredential, error) {
+	const maxAttempts = 3
+	for attempt := 1; ; attempt++ {
+		token, err := client.GetCameraToken(camID)
+		var unavailable *wyze.UnavailableError
+		if err == nil || attempt == maxAttempts || !errors.As(err, &unavailable) {
+			return token, err
+		}
+		log.Printf("Token for %s unavailable, retrying in %s", camID, unavailable.RetryAfter)
+		time.Sleep(unavailable.RetryAfter)
+	}
+}
+
 func envOr(key, fallback string) string {
 	if v := os.Getenv(key); v != "" {
 		return v
@@ -6,6 +6,8 @@ import (
 	"io"
 	"net/http"
 	"net/url"
+	"strconv"
+	"time"
 )
 
 // Client talks to the Cryze Python API to get camera info and tokens.
@@ -21,11 +23,28 @@ type DeviceInfo struct {
 	LanIP      string `json:"lanIp"`
 }
 
+// Inventory is the bulk /Camera/Inventory response.
+type Inventory struct {
+	Version int          `json:"version"`
+	Cameras []DeviceInfo `json:"cameras"`
+}
+
 type AccessCredential struct {
 	AccessID    string `json:"accessId"`
 	AccessToken string `json:"accessToken"`
 }
 
+// UnavailableError is returned when the API fails fast because Wyze/Mars is
+// down (HTTP 503). RetryAfter is how long the API asked callers to wait.
+type UnavailableError struct {
+	RetryAfter time.Duration
+	Body       string
+}
+
+func (e *UnavailableError) Error() string {
+	return fmt.Sprintf("upstream unavailable, retry after %s: %s", e.RetryAfter, e.Body)
+}
+
 func NewClient(baseURL string) *Client {
 	return &Client{
 		baseURL:    baseURL,
@@ -47,6 +66,38 @@ func (c *Client) GetCameraList() ([]string, error) {
 	return cameras, nil
 }
 
+// GetInventory fetches every camera in one request. Pass the ETag from a
+// previous call to poll conditionally; notModified is true (and inv nil) when
+// the inventory hasn't changed since then.
+func (c *Client) GetInventory(etag string) (inv *Inventory, newETag string, notModified bool, err error) {
+	req, err := http.NewRequest(http.MethodGet, c.baseURL+"/Camera/Inventory", nil)
+	if err != nil {
+		return nil, "", false, err
+	}
+	if etag != "" {
+		req.Header.Set("If-None-Match", etag)
+	}
+	resp, err := c.httpClient.Do(req)
+	if err != nil {
+		return nil, "", false, fmt.Errorf("GET /Camera/Inventory: %w", err)
+	}
+	defer resp.Body.Close()
+
+	if resp.StatusCode == http.StatusNotModified {
+		return nil, etag, true, nil
+	}
+	if resp.StatusCode != 200 {
+		body, _ := io.ReadAll(resp.Body)
+		return nil, "", false, fmt.Errorf("inventory: HTTP %d: %s", resp.StatusCode, string(body))
+	}
+
+	var result Inventory
+	if err := json.NewDecoder(resp.Body).Decode(&result); err != nil {
+		return nil, "", false, fmt.Errorf("decode inventory: %w", err)
+	}
+	return &result, resp.Header.Get("ETag"), false, nil
+}
+
 func (c *Client) GetDeviceInfo(deviceID string) (*DeviceInfo, error) {
 	u := fmt.Sprintf("%s/Camera/DeviceInfo?deviceId=%s", c.baseURL, url.QueryEscape(deviceID))
 	resp, err := c.httpClient.Get(u)
@@ -69,12 +120,26 @@ func (c *Client) GetDeviceInfo(deviceID string) (*DeviceInfo, error) {
 
 func (c *Client) GetCameraToken(deviceID string) (*AccessCredential, error) {
 	u := fmt.Sprintf("%s/Camera/CameraToken?deviceId=%s", c.baseURL, url.QueryEscape(deviceID))
-	resp, err := c.httpClient.Get(u)
+	req, err := http.NewRequest(http.MethodGet, u, nil)
+	if err != nil {
+		return nil, err
+	}
+	// Let the API give up on Mars when we would stop waiting anyway
+	req.Header.Set("X-Request-Timeout", strconv.Itoa(int(c.httpClient.Timeout.Seconds())))
+	resp, err := c.httpClient.Do(req)
 	if err != nil {
 		return nil, fmt.Errorf("GET /Camera/CameraToken: %w", err)
 	}
 	defer resp.Body.Close()
 
+	if resp.StatusCode == http.StatusServiceUnavailable {
+		body, _ := io.ReadAll(resp.Body)
+		retryAfter := 5 * time.Second
+		if seconds, err := strconv.Atoi(resp.Header.Get("Retry-After")); err == nil && seconds > 0 {
+			retryAfter = time.Duration(seconds) * time.Second
+		}
+		return nil, &UnavailableError{RetryAfter: retryAfter, Body: string(body)}
+	}
 	if resp.StatusCode != 200 {
 		body, _ := io.ReadAll(resp.Body)
 		return nil, fmt.Errorf("camera token %s: HTTP %d: %s", deviceID, resp.StatusCode, string(body))